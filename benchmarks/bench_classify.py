@@ -0,0 +1,91 @@
+"""Benchmark mention intent classification over a synthetic corpus.
+
+Compares the compiled IntentClassifier against the per-intent substring
+scans it replaced:
+
+    python benchmarks/bench_classify.py --mentions 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rybot  # noqa: E402
+
+FILLER = (
+    "gm frens just checking in on the charts today hoping for green candles "
+    "the renewal of my subscription reminded me to rebalance my bags before the weekend"
+).split()
+
+
+def make_corpus(intents, count, seed):
+    rng = random.Random(seed)
+    keywords = [word.rstrip("*") for intent in intents for word in intent["keywords"]]
+    corpus = []
+    for _ in range(count):
+        words = rng.choices(FILLER, k=rng.randint(8, 40))
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        corpus.append("@ryanbot " + " ".join(words))
+    return corpus
+
+
+def make_large_table(intents, extra, seed):
+    """The real intent table plus `extra` synthetic intents of 12 keywords each"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    synthetic = [
+        {"name": f"topic{n}", "keywords": ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(12)]}
+        for n in range(extra)
+    ]
+    return intents[:-1] + synthetic + intents[-1:]
+
+
+def legacy_classify(intents, text):
+    """The original lower() + any(word in text) chain"""
+    text = text.lower()
+    for intent in intents:
+        if any(word.rstrip("*") in text for word in intent["keywords"]):
+            return intent["name"]
+    return intents[-1]["name"]
+
+
+def compare(label, intents, corpus):
+    classifier = rybot.IntentClassifier(intents)
+    keywords = sum(len(intent["keywords"]) for intent in intents)
+
+    start = time.perf_counter()
+    legacy = [legacy_classify(intents, text) for text in corpus]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = classifier.classify_batch(corpus)
+    compiled_time = time.perf_counter() - start
+
+    differ = sum(a != b for a, b in zip(legacy, compiled))
+    print(f"{label} ({keywords} keywords, {len(corpus):,} mentions)")
+    print(f"  legacy:   {len(corpus) / legacy_time:12,.0f} mentions/s")
+    print(f"  compiled: {len(corpus) / compiled_time:12,.0f} mentions/s  ({legacy_time / compiled_time:.1f}x)")
+    print(f"  {differ:,} classified differently (substring matches inside words)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mentions", type=int, default=200000)
+    parser.add_argument("--extra-intents", type=int, default=40,
+                        help="synthetic intents added for the scaling run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    intents = rybot.get_content()["mentions"]["intents"]
+    compare("content/mentions.json", intents, make_corpus(intents, args.mentions, args.seed))
+
+    large = make_large_table(intents, args.extra_intents, args.seed)
+    compare("enlarged table", large, make_corpus(large, args.mentions, args.seed))
+
+
+if __name__ == "__main__":
+    main()
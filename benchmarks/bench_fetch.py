@@ -0,0 +1,130 @@
+"""Compare sequential vs concurrent data gathering against local stub servers.
+
+The concurrent case is gather_sources exactly as run_bot calls it: market
+data and news together, with mentions starting once market data is in.
+Each stub endpoint sleeps before answering to stand in for network latency:
+
+    python benchmarks/bench_fetch.py --delay 0.3 --runs 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rybot  # noqa: E402
+
+MARKETS = [
+    {
+        "id": f"coin-{i}", "name": f"Coin {i}", "symbol": f"c{i}",
+        "current_price": 100.0 + i, "price_change_percentage_24h": 1.5,
+        "market_cap": 10 ** 9, "total_volume": 10 ** 7,
+    }
+    for i in range(15)
+]
+NEWS = {"Data": [
+    {"title": f"Headline {i}", "url": f"https://example.com/{i}",
+     "source": "stub", "published_on": 1700000000 + i}
+    for i in range(50)
+]}
+
+
+def make_handler(delay):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps(MARKETS if self.path.startswith("/markets") else NEWS).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+class StubUser:
+    screen_name = "stub_user"
+
+
+class StubMention:
+    def __init__(self, i):
+        self.id = 1000 + i
+        self.text = "gm, what's the price outlook?"
+        self.user = StubUser()
+        self.created_at = datetime(2024, 1, 1)
+
+
+class StubAPI:
+    """Stands in for tweepy.API with a fixed mentions latency.
+
+    Serves a fixed timeline of `total` mentions, newest first, honouring
+    count/since_id/max_id so get_recent_mentions pages the way it would
+    against the real API.
+    """
+
+    def __init__(self, delay, total=15):
+        self.delay = delay
+        self.timeline = [StubMention(i) for i in reversed(range(total))]
+
+    def mentions_timeline(self, count=20, since_id=None, max_id=None, **kwargs):
+        time.sleep(self.delay)
+        page = [
+            m for m in self.timeline
+            if (since_id is None or m.id > since_id) and (max_id is None or m.id <= max_id)
+        ]
+        return page[:count]
+
+
+def sequential(memory):
+    return rybot.get_crypto_data(), rybot.get_crypto_news(), rybot.get_recent_mentions(memory)
+
+
+def best_of(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.3, help="stub latency per source (s)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    rybot.COINGECKO_MARKETS_URL = base + "/markets"
+    rybot.CRYPTOCOMPARE_NEWS_URL = base + "/news"
+    rybot._api = StubAPI(args.delay)
+    # Measure the network path, not the response cache
+    rybot.CACHE_DIR = tempfile.mkdtemp(prefix="bench-cache-")
+    rybot.CACHE_TTLS = {}
+
+    memory = {"mentions_replied": []}
+    seq = best_of(lambda: sequential(memory), args.runs)
+    # What run_bot does (sources=None): mentions overlap news, not market data
+    conc = best_of(lambda: rybot.gather_sources(memory), args.runs)
+    server.shutdown()
+
+    print(f"sequential: {seq * 1000:8.1f} ms")
+    print(f"concurrent: {conc * 1000:8.1f} ms  ({seq / conc:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
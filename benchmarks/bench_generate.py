@@ -0,0 +1,88 @@
+"""Measure tweet generation throughput for every generator.
+
+Renders N candidates per generator from the content registry with a fixed
+seed, so numbers are comparable between runs:
+
+    python benchmarks/bench_generate.py --count 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rybot  # noqa: E402
+
+
+def make_crypto_data(n=15):
+    return {
+        f"coin-{i}": rybot.CoinRecord(
+            f"coin-{i}", f"Coin {i}", f"C{i}", 100.0 + i * 7.5,
+            (-1) ** i * (0.5 + i / 10), 10 ** 9 - i, 10 ** 7
+        )
+        for i in range(n)
+    }
+
+
+NEWS = [
+    {"title": f"Regulators weigh new rules for stablecoin issuers, part {i} " + "x" * (i * 20),
+     "url": f"https://example.com/{i}", "source": "CoinDesk", "published_at": 1700000000 + i}
+    for i in range(10)
+]
+MENTIONS = [
+    {"id": i, "user": f"user{i}", "text": text}
+    for i, text in enumerate([
+        "where is the price going next week?",
+        "I'm a beginner, any advice on where to start?",
+        "is yield farming on new DeFi protocols safe?",
+        "gm! love the updates",
+    ])
+]
+
+
+class TrendStub:
+    """Price history that always reports the same three moves"""
+
+    def record(self, crypto_data, timestamp=None):
+        pass
+
+    def trend_alerts(self, now=None, coin_ids=None):
+        return [
+            {"coin_id": "coin-1", "window": "1h", "change": 6.2, "z": 3.1},
+            {"coin_id": "coin-4", "window": "4h", "change": -4.8, "z": -2.7},
+            {"coin_id": "coin-9", "window": "24h", "change": 12.5, "z": 2.2},
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000, help="tweets per generator")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    crypto_data = make_crypto_data()
+    rybot._price_history = TrendStub()
+    rybot.get_content()  # load the registry outside the timed loops
+
+    generators = {
+        "market": lambda: rybot.generate_market_update(crypto_data),
+        "news": lambda: rybot.generate_news_update(NEWS),
+        "education": lambda: rybot.generate_educational_content({"topics_used": []}),
+        "trend": lambda: rybot.generate_trend_analysis(crypto_data, {}),
+        "mention": lambda: rybot.respond_to_mention(MENTIONS[random.randrange(len(MENTIONS))]),
+    }
+
+    for name, generate in generators.items():
+        random.seed(args.seed)
+        start = time.perf_counter()
+        for _ in range(args.count):
+            tweet = generate()
+        elapsed = time.perf_counter() - start
+        assert rybot.tweet_weight(tweet) <= rybot.TWEET_MAX_WEIGHT
+        print(f"{name:10s} {args.count / elapsed:12,.0f} tweets/s  ({elapsed / args.count * 1e6:7.1f} us each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measure start-up cost: importing rybot with lazy vs eagerly loaded dependencies.
+
+Each case runs in a fresh interpreter so nothing is already imported, and
+the dry-run case checks that tweepy is never loaded:
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PRELUDE = f"""
+import sys, time
+sys.path[:0] = [{ROOT!r}, {BENCH_DIR!r}]
+start = time.perf_counter()
+"""
+
+CASES = {
+    # What every run paid before: all heavy dependencies loaded up front
+    "eager import": "import rybot, tweepy, requests, numpy, schedule",
+    "lazy import": "import rybot",
+    "dry run": """
+import contextlib, io, offline, rybot
+offline.install(rybot)
+rybot._api = rybot._client = None
+rybot.DRY_RUN = True
+with contextlib.redirect_stdout(io.StringIO()):
+    rybot.run_bot()
+assert "tweepy" not in sys.modules, "dry run loaded tweepy"
+""",
+}
+
+REPORT = """
+print(time.perf_counter() - start)
+"""
+
+
+def time_case(code):
+    output = subprocess.run(
+        [sys.executable, "-c", PRELUDE + code + REPORT],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in CASES.items():
+        results[name] = statistics.median(time_case(code) for _ in range(args.runs))
+        print(f"{name:13s} {results[name] * 1000:8.1f} ms (median of {args.runs})")
+
+    eager, lazy = results["eager import"], results["lazy import"]
+    print(f"lazy imports save {(eager - lazy) * 1000:.1f} ms per start ({eager / lazy:.1f}x faster import)")
+
+
+if __name__ == "__main__":
+    main()
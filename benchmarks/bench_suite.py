@@ -0,0 +1,171 @@
+"""Reproducible offline benchmark of a full bot run and every generator.
+
+Replays the recorded fixtures in benchmarks/fixtures through a local
+server and fake Twitter clients (see offline.py), with a fixed seed, and
+reports latency percentiles, allocations and peak RSS. Save a baseline
+once, then compare later runs against it:
+
+    python benchmarks/bench_suite.py --save-baseline
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rybot  # noqa: E402
+import offline  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Allocation tracing slows every call down, so it only covers a sample
+TRACE_SAMPLE = 200
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, iterations, warmup):
+    """Time `func` per call, then trace allocations over a sample of calls"""
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        rybot.reset_metrics()
+    timings.sort()
+
+    sample = min(iterations, TRACE_SAMPLE)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(sample):
+        func()
+        rybot.reset_metrics()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "retained_kb": (current - before) / 1024,
+        "traced_peak_kb": peak / 1024,
+    }
+
+
+def build_scenarios(memory_snapshot):
+    crypto_data, news_items, mentions = memory_snapshot
+    memory = {"topics_used": []}
+
+    def bot_run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            rybot.run_bot()
+
+    return {
+        "run_bot": bot_run,
+        "market": lambda: rybot.generate_market_update(crypto_data),
+        "news": lambda: rybot.generate_news_update(news_items),
+        "education": lambda: rybot.generate_educational_content(memory),
+        "trend": lambda: rybot.generate_trend_analysis(crypto_data, {}),
+        "mention": lambda: rybot.respond_to_mention(mentions[random.randrange(len(mentions))]),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print the change against `baseline`; returns the scenarios that regressed.
+
+    A scenario regresses when its p50 grows by more than `tolerance` and by
+    at least `min_delta_ms`, so jitter on microsecond timings isn't flagged.
+    """
+    regressions = []
+    print(f"\n{'scenario':10s} {'p50 base':>10s} {'p50 now':>10s} {'change':>8s}")
+    for name, stats in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        change = stats["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        flag = ""
+        if change > tolerance and stats["p50_ms"] - old["p50_ms"] >= min_delta_ms:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:10s} {old['p50_ms']:10.3f} {stats['p50_ms']:10.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="timed calls per generator")
+    parser.add_argument("--runs", type=int, default=200, help="timed end-to-end bot runs")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-cache", action="store_true", help="revalidate every fetch with the fixture server")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run's results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore p50 slowdowns smaller than this")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    server = offline.install(rybot, cache=not args.no_cache)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            snapshot = rybot.gather_sources(rybot.load_memory())
+        if not snapshot[0]:
+            sys.exit("Fixture server returned no market data")
+        rybot.get_content()  # load the registry outside the timed loops
+
+        results = {
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "universe": len(snapshot[0]),
+            "cache": not args.no_cache,
+            "scenarios": {},
+        }
+        print(f"{'scenario':10s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'alloc peak':>11s}")
+        for name, func in build_scenarios(snapshot).items():
+            random.seed(args.seed)
+            iterations = args.runs if name == "run_bot" else args.iterations
+            stats = measure(func, iterations, args.warmup)
+            results["scenarios"][name] = stats
+            print(f"{name:10s} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f} {stats['p99_ms']:9.3f} "
+                  f"{stats['traced_peak_kb']:8.0f} KB")
+    finally:
+        server.stop()
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["peak_rss_mb"] = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    print(f"peak RSS: {results['peak_rss_mb']:.1f} MB, fixture requests: {server.requests}, "
+          f"tweets posted: {len(rybot.get_client().posted)}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Replay recorded API fixtures so the bot can run end to end without a network.
+
+`install(rybot)` points the market and news URLs at a local fixture server,
+swaps the Twitter clients for in-process fakes and moves state and cache
+into a scratch directory. Nothing here talks to the real services.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def market_page(recorded, page, per_page):
+    """Serve any page of the universe from the one recorded page.
+
+    Pages past the first reuse the recorded rows under page-suffixed IDs with
+    market caps scaled down, so a 1000-coin universe keeps its ordering.
+    """
+    if page == 1:
+        return recorded[:per_page]
+    scale = 0.01 ** (page - 1)
+    return [
+        dict(coin, id=f"{coin['id']}-p{page}", symbol=f"{coin['symbol']}{page}",
+             market_cap=int(coin["market_cap"] * scale))
+        for coin in recorded[:per_page]
+    ]
+
+
+def rebase_news(news):
+    """Shift recorded stories so the newest was published just now.
+
+    The bot expires stories by wall-clock age, so recorded ones would
+    otherwise all be too old to post.
+    """
+    stories = news.get("Data") or []
+    if not stories:
+        return news
+    shift = int(time.time()) - max(story["published_on"] for story in stories)
+    return dict(news, Data=[dict(story, published_on=story["published_on"] + shift) for story in stories])
+
+
+class FixtureServer:
+    """Local HTTP server answering the CoinGecko (markets, simple/price) and CryptoCompare endpoints.
+
+    Bodies are pre-encoded per query and carry an ETag, so conditional
+    requests from the response cache get a 304 just like upstream.
+    """
+
+    def __init__(self, markets=None, news=None):
+        self.markets = markets if markets is not None else load_fixture("coingecko_markets.json")
+        self.news = news if news is not None else rebase_news(load_fixture("cryptocompare_news.json"))
+        self.requests = 0
+        self._bodies = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def body_for(self, path, query):
+        key = (path, tuple(sorted((k, v[0]) for k, v in query.items())))
+        if key not in self._bodies:
+            if path.startswith("/api/v3/coins/markets"):
+                page = int(query.get("page", ["1"])[0])
+                per_page = int(query.get("per_page", ["250"])[0])
+                data = market_page(self.markets, page, per_page)
+            elif path.startswith("/api/v3/simple/price"):
+                ids = set(query.get("ids", [""])[0].split(","))
+                data = {coin["id"]: {"usd": coin["current_price"]} for coin in self.markets if coin["id"] in ids}
+            elif path.startswith("/data/v2/news"):
+                data = self.news
+            else:
+                return None, None
+            body = json.dumps(data).encode()
+            self._bodies[key] = (body, '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest())
+        return self._bodies[key]
+
+    def _make_handler(self):
+        fixtures = self
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fixtures.requests += 1
+                url = urlparse(self.path)
+                body, etag = fixtures.body_for(url.path, parse_qs(url.query))
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return FixtureHandler
+
+
+class FakeUser:
+    def __init__(self, screen_name):
+        self.screen_name = screen_name
+
+
+class FakeMention:
+    def __init__(self, record, mention_id):
+        self.id = mention_id
+        self.text = record["text"]
+        self.user = FakeUser(record["user"])
+        self.created_at = datetime.fromisoformat(record["created_at"])
+
+
+class FakeAPI:
+    """Stands in for tweepy.API, replaying recorded mentions.
+
+    Each call delivers `arrivals` new mentions on top of the recorded
+    timeline, cycling through the recorded texts with fresh IDs, so every
+    run has something to answer. since_id/max_id/count are honoured.
+    """
+
+    def __init__(self, mentions=None, arrivals=3):
+        records = mentions if mentions is not None else load_fixture("mentions.json")
+        self.records = records
+        self.arrivals = arrivals
+        self.timeline = sorted((FakeMention(r, r["id"]) for r in records), key=lambda m: -m.id)
+        self.next_id = self.timeline[0].id + 1000 if self.timeline else 1
+        self.calls = 0
+
+    def mentions_timeline(self, count=20, since_id=None, max_id=None, **kwargs):
+        if max_id is None:
+            for _ in range(self.arrivals):
+                record = self.records[self.calls % len(self.records)]
+                self.timeline.insert(0, FakeMention(record, self.next_id))
+                self.next_id += 1000
+                self.calls += 1
+        page = [
+            m for m in self.timeline
+            if (since_id is None or m.id > since_id) and (max_id is None or m.id <= max_id)
+        ]
+        return page[:count]
+
+
+class FakeResponse:
+    def __init__(self, data, headers):
+        self._data = data
+        self.data = data["data"]
+        self.headers = headers
+
+    def json(self):
+        return self._data
+
+
+class FakeClient:
+    """Stands in for tweepy.Client: posts succeed with increasing IDs and
+    rate-limit headers that never run dry."""
+
+    def __init__(self, limit=10 ** 6):
+        self.limit = limit
+        self.next_id = 1900000000000000000
+        self.posted = []
+        self.lookups = 0
+
+    def _post(self, text, **kwargs):
+        self.next_id += 1
+        self.posted.append(text)
+        headers = {
+            "x-rate-limit-limit": str(self.limit),
+            "x-rate-limit-remaining": str(self.limit - 1),
+            "x-rate-limit-reset": str(int(datetime.now().timestamp()) + 900),
+        }
+        return FakeResponse({"data": {"id": str(self.next_id), "text": text}}, headers)
+
+    def create_tweet(self, text=None, **kwargs):
+        return self._post(text, **kwargs)
+
+    def request(self, method, route, json=None, **kwargs):
+        return self._post(json["text"])
+
+    def get_tweets(self, ids, **kwargs):
+        """Deterministic public metrics derived from each tweet ID"""
+        self.lookups += 1
+        tweets = []
+        for tweet_id in ids:
+            seed = int(tweet_id) % 997
+            tweets.append(SimpleNamespace(id=int(tweet_id), public_metrics={
+                "like_count": seed % 40, "retweet_count": seed % 7, "reply_count": seed % 5,
+                "quote_count": seed % 3, "impression_count": seed * 10,
+            }))
+        return SimpleNamespace(data=tweets)
+
+
+def install(rybot, state_dir=None, cache=True):
+    """Point `rybot` at the fixture server and fakes; returns the server.
+
+    Call once before the first run. With `cache=False` every fetch goes to
+    the fixture server instead of being served from the response cache.
+    """
+    server = FixtureServer().start()
+    rybot.COINGECKO_MARKETS_URL = server.base_url + "/api/v3/coins/markets"
+    rybot.CRYPTOCOMPARE_NEWS_URL = server.base_url + "/data/v2/news/"
+    rybot.COINGECKO_SIMPLE_PRICE_URL = server.base_url + "/api/v3/simple/price"
+    rybot._api = FakeAPI()
+    rybot._client = FakeClient()
+    rybot.STATE_DIR = state_dir or tempfile.mkdtemp(prefix="bench-state-")
+    rybot.CACHE_DIR = os.path.join(rybot.STATE_DIR, "cache")
+    if not cache:
+        rybot.CACHE_TTLS = {}
+    rybot.METRICS_FILE = None
+    rybot.REPLY_RATE_LIMIT = rybot._client.limit
+    rybot._state_store = rybot._price_history = rybot._reply_bucket = rybot._outbox = None
+    rybot._engagement_store = rybot._content_guard = None
+    return server
@@ -0,0 +1,56 @@
+"""Record live API responses into benchmarks/fixtures for offline replay.
+
+Fetches one CoinGecko markets page and the CryptoCompare news feed, and
+(with Twitter credentials in the environment) the account's recent
+mentions:
+
+    python benchmarks/record_fixtures.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rybot  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+MARKET_FIELDS = ("id", "name", "symbol", "current_price", "price_change_percentage_24h",
+                 "market_cap", "total_volume")
+NEWS_FIELDS = ("id", "title", "url", "source", "published_on", "body", "categories")
+
+
+def save(name, data):
+    path = os.path.join(FIXTURES_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+    print(f"Wrote {path}")
+
+
+def main():
+    session = rybot.get_http_session()
+
+    response = session.get(rybot.COINGECKO_MARKETS_URL, timeout=30, params={
+        "vs_currency": "usd", "order": "market_cap_desc", "per_page": rybot.MARKET_PAGE_SIZE,
+        "page": 1, "sparkline": False, "price_change_percentage": "24h",
+    })
+    response.raise_for_status()
+    save("coingecko_markets.json", [{k: coin.get(k) for k in MARKET_FIELDS} for coin in response.json()])
+
+    response = session.get(rybot.CRYPTOCOMPARE_NEWS_URL, params={"lang": "EN"}, timeout=30)
+    response.raise_for_status()
+    news = response.json()
+    save("cryptocompare_news.json", {"Data": [{k: item.get(k) for k in NEWS_FIELDS} for item in news["Data"]]})
+
+    if os.environ.get("TWITTER_ACCESS_TOKEN"):
+        mentions = rybot.get_api().mentions_timeline(count=rybot.MENTIONS_PAGE_SIZE)
+        save("mentions.json", [
+            {"id": m.id, "text": m.text, "user": m.user.screen_name, "created_at": m.created_at.isoformat()}
+            for m in mentions
+        ])
+
+
+if __name__ == "__main__":
+    main()
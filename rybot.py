@@ -1,11 +1,30 @@
 import os
 import time
+import signal
+import argparse
 import json
 import random
-import requests
-import tweepy
-import schedule
+import re
+import math
+import zlib
+import string
+import base64
+import bisect
+import asyncio
+import hashlib
+import sqlite3
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import partial, wraps
+
+# tweepy, requests, numpy and schedule are imported where they're first
+# needed: together they take a few hundred milliseconds to load, and a run
+# that aborts early or only generates content shouldn't pay for all of them
 
 # Set up environment variables (you'll use GitHub Secrets for deployment)
 # For local testing, use a .env file or set these directly in your environment
@@ -14,220 +33,2017 @@ TWITTER_CONSUMER_SECRET = os.environ.get("TWITTER_CONSUMER_SECRET")
 TWITTER_ACCESS_TOKEN = os.environ.get("TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_TOKEN_SECRET = os.environ.get("TWITTER_ACCESS_TOKEN_SECRET")
 
-# Initialize Twitter API client
-auth = tweepy.OAuthHandler(TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET)
-auth.set_access_token(TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET)
-api = tweepy.API(auth)
-client = tweepy.Client(
-    consumer_key=TWITTER_CONSUMER_KEY,
-    consumer_secret=TWITTER_CONSUMER_SECRET,
-    access_token=TWITTER_ACCESS_TOKEN,
-    access_token_secret=TWITTER_ACCESS_TOKEN_SECRET
+TWITTER_CREDENTIALS = (
+    TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET, TWITTER_ACCESS_TOKEN, TWITTER_ACCESS_TOKEN_SECRET
 )
 
-# Memory file to store agent state between runs
+# Twitter clients are created on first use, see get_api()/get_client()
+_api = None
+_client = None
+
+# Generate content and print it instead of posting; never loads tweepy
+DRY_RUN = False
+
+def get_api():
+    """Return the v1.1 API (mentions), creating it on first use"""
+    global _api
+    if _api is None:
+        import tweepy
+        consumer_key, consumer_secret, access_token, access_token_secret = TWITTER_CREDENTIALS
+        auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+        auth.set_access_token(access_token, access_token_secret)
+        _api = tweepy.API(auth)
+    return _api
+
+def get_client():
+    """Return the v2 Client (posting), creating it on first use"""
+    global _client
+    if _client is None:
+        import tweepy
+        consumer_key, consumer_secret, access_token, access_token_secret = TWITTER_CREDENTIALS
+        _client = tweepy.Client(
+            consumer_key=consumer_key,
+            consumer_secret=consumer_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret
+        )
+    return _client
+
+# Agent state between runs. "sqlite" (default) updates agent_memory.db
+# incrementally; "json" keeps the original single agent_memory.json file.
+STATE_DIR = os.environ.get("BOT_STATE_DIR", ".")
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "sqlite")
 MEMORY_FILE = "agent_memory.json"
+STATE_DB_FILE = "agent_memory.db"
 
-def load_memory():
-    """Load agent memory from file"""
+# How many recent tweets/replied mentions a run loads into memory. The SQLite
+# backend keeps the full history on disk; the JSON backend trims to this.
+MEMORY_WINDOW = 100
+
+# Meta keys that overlapping runs may both change are merged on save instead
+# of the last run overwriting the other's: key -> merge(base, theirs, ours),
+# where `base` is the value this run loaded, `theirs` what another run saved
+# since and `ours` this run's value. Filled in next to each kind of state.
+STATE_MERGERS = {}
+
+# Replied-mention dedup index: two rotating Bloom filter generations, each
+# retired once it holds MENTION_INDEX_CAPACITY IDs or gets older than
+# MENTION_INDEX_MAX_AGE_DAYS. Its size is fixed however many mentions we answer.
+MENTION_INDEX_CAPACITY = 50_000
+MENTION_INDEX_ERROR_RATE = 0.001
+MENTION_INDEX_MAX_AGE_DAYS = 30
+
+# Mentions are paged 200 at a time (the v1.1 maximum) until the backlog is drained
+MENTIONS_PAGE_SIZE = 200
+MAX_MENTION_PAGES = 10
+
+# Post pacing: a token bucket sized to the POST /2/tweets quota, corrected by
+# the x-rate-limit-* headers on every response. A run stops draining the
+# outbox once ENGAGE_DEADLINE seconds pass.
+REPLY_RATE_LIMIT = int(os.environ.get("REPLY_RATE_LIMIT", 100))
+REPLY_RATE_WINDOW = 15 * 60
+ENGAGE_DEADLINE = float(os.environ.get("ENGAGE_DEADLINE", 300))
+
+# Outbox: every tweet and reply is stored in OUTBOX_DB_FILE under an
+# idempotency key before it's sent, then drained with per-item exponential
+# backoff until OUTBOX_MAX_ATTEMPTS. OUTBOX_BREAKER_THRESHOLD consecutive
+# failures open the circuit and pause draining for OUTBOX_BREAKER_COOLDOWN
+# seconds. An item claimed for sending more than OUTBOX_LEASE seconds ago
+# (the process died mid-send) is looked up on our own timeline before it's
+# retried, so a crash can't post it twice.
+OUTBOX_DB_FILE = "outbox.db"
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 30.0
+OUTBOX_BACKOFF_MAX = 3600.0
+OUTBOX_BREAKER_THRESHOLD = 3
+OUTBOX_BREAKER_COOLDOWN = 300.0
+OUTBOX_LEASE = 120
+OUTBOX_RECONCILE_COUNT = 200
+OUTBOX_RETENTION_DAYS = 30
+OUTBOX_DRAIN_INTERVAL = 30  # seconds between drains in daemon mode
+# A 400, or a 403 whose message says what's wrong with the post itself, fails
+# the item for good. Any other 401/403 (revoked credentials, suspended app) is
+# the account's problem, not the post's: it opens the breaker and the queue waits.
+OUTBOX_CONTENT_REJECTIONS = ("duplicate", "not allowed to create a tweet", "deleted", "not visible", "too long")
+
+# Content guard: X rejects a tweet that repeats one posted recently, so every
+# post is checked against those from the last POST_DUPLICATE_WINDOW_HOURS
+# (normalized text hash, at most POST_HASH_CAPACITY) and standalone tweets
+# also against the last POST_NEAR_CAPACITY of those by MinHash, where an
+# estimated Jaccard of POST_DUPLICATE_THRESHOLD or more counts as a repeat.
+# Older posts expire, so content that rotates (topics, canned replies) can
+# come round again. Replies only get the exact check: they differ by the
+# @user they address. A repeat is regenerated up to POST_REGENERATE_ATTEMPTS
+# times, then dropped. The history is a table in OUTBOX_DB_FILE.
+POST_DUPLICATE_WINDOW_HOURS = 48
+POST_HASH_CAPACITY = 20000
+POST_NEAR_CAPACITY = 5000
+POST_MINHASH_PERMUTATIONS = 64
+POST_LSH_BANDS = 8  # 8 rows per band: only ~3% of ~50%-similar posts are compared
+POST_DUPLICATE_THRESHOLD = 0.9
+POST_REGENERATE_ATTEMPTS = 3
+
+# Engagement analytics: public metrics of our tweets, looked up 100 IDs per
+# request once a tweet is ENGAGEMENT_MIN_AGE seconds old and then at most
+# every ENGAGEMENT_REFRESH_INTERVAL until it's ENGAGEMENT_MAX_AGE_DAYS old,
+# stored column-wise in ENGAGEMENT_FILE. A tweet's score weights each metric
+# by ENGAGEMENT_METRICS; the scores per tweet type are the rewards the
+# action scheduler learns from.
+ENGAGEMENT_FILE = "engagement.npz"
+ENGAGEMENT_METRICS = {
+    "like_count": 1,
+    "retweet_count": 2,
+    "reply_count": 2,
+    "quote_count": 2,
+    "impression_count": 0,
+}
+ENGAGEMENT_BATCH_SIZE = 100  # the GET /2/tweets maximum
+ENGAGEMENT_MAX_REQUESTS = 1  # per run
+ENGAGEMENT_MIN_AGE = 60 * 60
+ENGAGEMENT_REFRESH_INTERVAL = 6 * 60 * 60
+ENGAGEMENT_MAX_AGE_DAYS = 7
+ENGAGEMENT_RETENTION_DAYS = 90
+
+# Action scheduler: a bandit over the actions run_bot can take. Rewards are
+# the engagement scores per tweet type, shrunk towards the overall mean by
+# BANDIT_PRIOR pseudo-tweets. ACTION_POLICY is "thompson" (sample each
+# action's mean) or "ucb" (optimism bonus for rarely picked actions). The
+# learned value is scaled by how fresh the action's material is and, as the
+# post budget runs out, divided by the posts it would use.
+ACTION_POLICY = os.environ.get("ACTION_POLICY", "thompson")
+BANDIT_PRIOR = 5
+BANDIT_UCB_C = 1.0
+BANDIT_MARKET_REFRESH_HOURS = 4  # a market update is fully fresh again after this
+BANDIT_EDUCATION_REFRESH_HOURS = 12
+BANDIT_NEWS_HALF_LIFE_HOURS = 6
+BANDIT_MENTION_URGENCY = 1.0  # a full backlog of mentions doubles engage's value
+
+# Tweet type each action posts, for engagement stats
+ACTION_TWEET_TYPES = {
+    "market": "market_update",
+    "news": "news",
+    "education": "education",
+    "trend": "trend_analysis",
+    "engage": "reply",
+}
+
+# Trend engine: every price tick goes into a ring buffer (one row per coin)
+# persisted to PRICE_HISTORY_FILE. A coin is flagged when its move over one
+# of the windows is at least TREND_MIN_MOVE percent and, once there's enough
+# history to estimate volatility, at least TREND_Z_THRESHOLD sigmas.
+PRICE_HISTORY_FILE = "price_history.npz"
+PRICE_HISTORY_SLOTS = 512
+PRICE_TICK_MIN_SPACING = 30  # seconds; closer ticks overwrite the latest one
+TREND_WINDOWS = {"1h": 3600, "4h": 4 * 3600, "24h": 24 * 3600}
+# A tick between 80% and 125% of a window old can anchor it; with no tick in
+# that range (sparse or stale history) the window is skipped, not mislabelled
+TREND_WINDOW_TOLERANCE = 0.8
+TREND_MIN_MOVE = 3.0
+TREND_Z_THRESHOLD = 2.0
+TREND_MIN_VOL_SAMPLES = 8
+
+# Daemon mode: minutes between runs of each action, as a (min, max) range so
+# every tick lands at a random point inside it
+DAEMON_CADENCES = {
+    "market": (170, 190),
+    "news": (100, 140),
+    "education": (340, 380),
+    "trend": (50, 70),
+    "engage": (10, 20),
+}
+
+# Data sources each action needs, so a daemon tick only fetches those
+ACTION_SOURCES = {
+    "market": ("market",),
+    "news": ("news",),
+    "education": (),
+    "trend": ("market",),
+    "engage": ("mentions",),
+}
+
+# Data source endpoints
+COINGECKO_MARKETS_URL = "https://api.coingecko.com/api/v3/coins/markets"
+CRYPTOCOMPARE_NEWS_URL = "https://min-api.cryptocompare.com/data/v2/news/"
+COINGECKO_SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+
+# Watch mode (--watch): poll just the USD price of the WATCH_TOP_N largest
+# coins every WATCH_INTERVAL seconds. A coin alerts when it has moved
+# WATCH_TRIGGER_PCT since WATCH_WINDOW seconds ago, or clears one of its
+# WATCH_LEVELS (e.g. WATCH_LEVELS='{"bitcoin": [100000]}') by WATCH_LEVEL_BAND.
+# After a move alert the coin re-arms only once the move eases below
+# WATCH_REARM_PCT, and alerts at most once per WATCH_COOLDOWN seconds.
+WATCH_TOP_N = int(os.environ.get("WATCH_TOP_N", 25))
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", 15))
+WATCH_WINDOW = 60 * 60
+WATCH_TRIGGER_PCT = float(os.environ.get("WATCH_TRIGGER_PCT", 5.0))
+WATCH_REARM_PCT = 3.0
+WATCH_COOLDOWN = 60 * 60
+WATCH_LEVELS = json.loads(os.environ.get("WATCH_LEVELS", "{}"))
+WATCH_LEVEL_BAND = 0.005
+
+# Market universe: the top MARKET_UNIVERSE_SIZE coins by market cap, fetched
+# in pages of MARKET_PAGE_SIZE with at most MARKET_PAGE_CONCURRENCY requests
+# in flight to stay inside CoinGecko's free-tier rate limit
+MARKET_UNIVERSE_SIZE = int(os.environ.get("MARKET_UNIVERSE_SIZE", 1000))
+MARKET_PAGE_SIZE = 250
+MARKET_PAGE_CONCURRENCY = 2
+
+# News pipeline: the feed is newest first, so each fetch stops reading at the
+# memory["news_cursor"] high-water mark. Stories are deduplicated by URL and
+# by MinHash of their titles (NEWS_DUPLICATE_THRESHOLD estimated Jaccard over
+# word bigrams), using LSH bands so a lookup doesn't scan every story. Posted
+# stories stay in a NEWS_POSTED_CAPACITY-entry index; unposted ones wait in a
+# queue, newest first, and the next news tweet takes the head of it.
+# Every ingest drops queued stories more than NEWS_MAX_AGE_HOURS old, so a
+# stalled feed can't leave stale stories waiting to be posted.
+NEWS_MINHASH_PERMUTATIONS = 32
+NEWS_LSH_BANDS = 16  # 2 rows per band: titles ~50% similar almost always share a bucket
+NEWS_DUPLICATE_THRESHOLD = 0.6
+NEWS_POSTED_CAPACITY = 500
+NEWS_QUEUE_SIZE = 50
+NEWS_MAX_AGE_HOURS = 24
+
+# Tweet content (insights, commentaries, topics, replies and the layout of
+# each tweet type) lives in JSON files under CONTENT_DIR, loaded once
+CONTENT_DIR = os.environ.get(
+    "BOT_CONTENT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+)
+TWEET_MAX_WEIGHT = 280
+
+# Per-source deadline (seconds) for the data-gathering phase; a source that
+# misses it is skipped for this run instead of holding up the others
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", 10))
+HTTP_POOL_SIZE = 10
+
+# Shared keep-alive HTTP session, created on first use
+_http_session = None
+
+# Dedicated worker threads for blocking fetches. asyncio.run() waits for its
+# default executor on shutdown, which would turn a skipped source back into a
+# blocking one, so fetches run on a pool that outlives the event loop.
+_fetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fetch")
+
+# Market pages are fetched on their own pool: get_crypto_data itself runs on
+# the fetch pool, and waiting on that pool from inside it could deadlock
+_page_executor = ThreadPoolExecutor(max_workers=MARKET_PAGE_CONCURRENCY, thread_name_prefix="market-page")
+
+# Parsed market pages keyed by page number, as (response digest, records),
+# so unchanged pages aren't parsed again
+_market_pages = {}
+
+# On-disk response cache for the market/news APIs. Entries are revalidated
+# with ETag/Last-Modified once their endpoint's TTL (seconds) runs out.
+CACHE_DIR = os.environ.get("BOT_CACHE_DIR", ".cache/http")
+CACHE_TTLS = {
+    "markets": 60,
+    "news": 300,
+}
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_STATS = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "evictions": 0}
+
+# Run metrics: every phase of a run is timed as a span. With METRICS_FILE set,
+# the spans of the latest run are written there in Prometheus text format
+# (e.g. for node_exporter's textfile collector). Every series carries
+# METRICS_LABELS; with --accounts each account sets an account label and
+# writes its own file next to METRICS_FILE (rybot.prom -> rybot-<name>.prom).
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_LABELS = {}
+_spans = []
+_spans_lock = threading.Lock()
+_span_context = threading.local()
+
+# One lock per cache key so concurrent fetches of the same URL collapse into one
+_cache_locks = {}
+_cache_locks_guard = threading.Lock()
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; fall back to in-process locking
+    fcntl = None
+
+@contextmanager
+def span(phase, **labels):
+    """Time one phase of a run and collect its bytes, cache hits and retries"""
+    record = {
+        "phase": phase, "labels": labels, "seconds": 0.0,
+        "bytes": 0, "cache_hits": 0, "retries": 0, "errors": 0
+    }
+    stack = getattr(_span_context, "stack", None)
+    if stack is None:
+        stack = _span_context.stack = []
+    stack.append(record)
+    start = time.perf_counter()
     try:
-        with open(MEMORY_FILE, "r") as f:
+        yield record
+    except Exception:
+        record["errors"] += 1
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        stack.pop()
+        with _spans_lock:
+            _spans.append(record)
+
+def traced(phase, **labels):
+    """Decorator that runs a function inside a span named after it"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(phase, step=func.__name__, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count_in_span(key, amount=1):
+    """Add to a counter (bytes, cache_hits, retries) of the innermost open span"""
+    stack = getattr(_span_context, "stack", None)
+    if stack:
+        stack[-1][key] += amount
+
+def reset_metrics():
+    """Start collecting spans for a new run"""
+    with _spans_lock:
+        _spans.clear()
+
+def _metric_labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+def format_metrics():
+    """Spans of the current run in Prometheus text exposition format"""
+    totals = {}
+    with _spans_lock:
+        spans = list(_spans)
+    for record in spans:
+        key = (record["phase"], tuple(sorted(record["labels"].items())))
+        total = totals.setdefault(key, {"calls": 0, "seconds": 0.0, "bytes": 0, "cache_hits": 0, "retries": 0, "errors": 0})
+        total["calls"] += 1
+        for field in ("seconds", "bytes", "cache_hits", "retries", "errors"):
+            total[field] += record[field]
+    
+    metrics = [
+        ("calls", "gauge", "Times the phase ran in the last run"),
+        ("seconds", "gauge", "Wall-clock seconds spent in the phase in the last run"),
+        ("bytes", "gauge", "Response bytes downloaded during the phase in the last run"),
+        ("cache_hits", "gauge", "Responses served from the HTTP cache during the phase in the last run"),
+        ("retries", "gauge", "Retried API calls during the phase in the last run"),
+        ("errors", "gauge", "Phase invocations that raised in the last run"),
+    ]
+    lines = []
+    for field, kind, help_text in metrics:
+        lines.append(f"# HELP rybot_phase_{field} {help_text}")
+        lines.append(f"# TYPE rybot_phase_{field} {kind}")
+        for (phase, labels), total in sorted(totals.items()):
+            series_labels = {**METRICS_LABELS, "phase": phase, **dict(labels)}
+            lines.append(f"rybot_phase_{field}{{{_metric_labels(series_labels)}}} {total[field]}")
+    lines.append("# HELP rybot_http_cache_events_total HTTP cache events since the process started")
+    lines.append("# TYPE rybot_http_cache_events_total counter")
+    for event, count in sorted(CACHE_STATS.items()):
+        lines.append(f"rybot_http_cache_events_total{{{_metric_labels({**METRICS_LABELS, 'event': event})}}} {count}")
+    lines.append("# HELP rybot_last_run_timestamp_seconds When the last run finished")
+    lines.append("# TYPE rybot_last_run_timestamp_seconds gauge")
+    run_labels = f"{{{_metric_labels(METRICS_LABELS)}}}" if METRICS_LABELS else ""
+    lines.append(f"rybot_last_run_timestamp_seconds{run_labels} {time.time():.3f}")
+    return "\n".join(lines) + "\n"
+
+def export_metrics(path=None):
+    """Write this run's metrics to METRICS_FILE (if configured) and print a summary"""
+    path = METRICS_FILE if path is None else path
+    if path:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(format_metrics())
+        os.replace(tmp_path, path)
+    
+    phases = {}
+    with _spans_lock:
+        for record in _spans:
+            phases[record["phase"]] = phases.get(record["phase"], 0.0) + record["seconds"]
+    if phases:
+        # Concurrent spans (e.g. the three fetches) add up, so this can exceed wall-clock time
+        print("Phase timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items()))
+
+def get_http_session():
+    """Return the shared pooled HTTP session"""
+    global _http_session
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _http_session = session
+    return _http_session
+
+def _cache_key(url, params):
+    """Stable cache key for a URL and its query parameters"""
+    raw = url + "?" + "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _read_cache_entry(path):
+    try:
+        with open(path, "r") as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
-        # Initialize with default values if file doesn't exist
-        return {
-            "tweets": [],
-            "last_prices": {},
-            "topics_used": [],
-            "last_run": datetime.now().isoformat(),
-            "total_tweets": 0,
-            "mentions_replied": []
+        return None
+
+def _write_cache_entry(path, entry):
+    """Write a cache entry atomically so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+def _evict_cache_entries():
+    """Drop least recently used entries until the cache is within its bounds"""
+    try:
+        entries = []
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(CACHE_DIR, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+    except FileNotFoundError:
+        return
+    
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > CACHE_MAX_ENTRIES or total_bytes > CACHE_MAX_BYTES):
+        _, size, name = entries.pop(0)
+        for suffix in ("", ".lock"):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name + suffix))
+            except FileNotFoundError:
+                pass
+        total_bytes -= size
+        CACHE_STATS["evictions"] += 1
+
+def cached_fetch(url, params=None, endpoint="default", timeout=None):
+    """GET a JSON document through the on-disk cache and return its cache entry.
+    
+    Fresh entries are served without touching the network. Expired entries
+    are revalidated with If-None-Match/If-Modified-Since, and if the upstream
+    fails a stale copy is returned rather than nothing. Only one thread (and,
+    where flock is available, one process) fetches a given URL at a time;
+    the others wait and then read its result.
+    
+    The entry's "digest" identifies the response body, so callers can tell
+    when a document hasn't changed and skip reprocessing it.
+    """
+    ttl = CACHE_TTLS.get(endpoint, 0)
+    timeout = FETCH_TIMEOUT if timeout is None else timeout
+    key = _cache_key(url, params)
+    path = os.path.join(CACHE_DIR, key + ".json")
+    
+    entry = _read_cache_entry(path)
+    if entry and time.time() - entry["fetched_at"] < ttl:
+        CACHE_STATS["hits"] += 1
+        count_in_span("cache_hits")
+        os.utime(path)
+        return entry
+    
+    with _cache_locks_guard:
+        key_lock = _cache_locks.setdefault(key, threading.Lock())
+    
+    with key_lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + ".lock", "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            
+            # Someone else may have refreshed the entry while we waited
+            entry = _read_cache_entry(path)
+            if entry and time.time() - entry["fetched_at"] < ttl:
+                CACHE_STATS["hits"] += 1
+                count_in_span("cache_hits")
+                os.utime(path)
+                return entry
+            
+            headers = {}
+            if entry:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            
+            try:
+                response = get_http_session().get(url, params=params, headers=headers, timeout=timeout)
+                count_in_span("bytes", len(response.content))
+                if response.status_code == 304 and entry:
+                    CACHE_STATS["revalidated"] += 1
+                    count_in_span("cache_hits")
+                    entry["fetched_at"] = time.time()
+                    _write_cache_entry(path, entry)
+                    return entry
+                response.raise_for_status()
+                body = response.json()
+            except Exception:
+                if entry:
+                    print(f"Upstream error for {url}, serving stale cache entry")
+                    CACHE_STATS["stale"] += 1
+                    return entry
+                raise
+            
+            CACHE_STATS["misses"] += 1
+            entry = {
+                "url": url,
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "digest": hashlib.sha1(response.content).hexdigest(),
+                "body": body
+            }
+            _write_cache_entry(path, entry)
+    
+    _evict_cache_entries()
+    return entry
+
+def cached_get_json(url, params=None, endpoint="default", timeout=None):
+    """GET a JSON document through the on-disk cache"""
+    return cached_fetch(url, params, endpoint, timeout)["body"]
+
+def state_path(name):
+    """Path of a state file inside the bot's state directory"""
+    return os.path.join(STATE_DIR, name)
+
+def _file_stamp(path):
+    """(mtime, size) of a file, or None if it doesn't exist, to tell if someone else wrote it"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock on `path` (via a .lock file) for a read-merge-write"""
+    with open(path + ".lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def default_memory():
+    """Fresh agent memory for a first run"""
+    return {
+        "tweets": [],
+        "last_prices": {},
+        "topics_used": [],
+        "last_run": datetime.now().isoformat(),
+        "total_tweets": 0,
+        "mentions_replied": []
+    }
+
+class JsonStateStore:
+    """Original backend: the whole memory lives in one JSON file"""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # Initialize with default values if file doesn't exist
+            return default_memory()
+    
+    def save(self, memory):
+        # Trim histories to prevent file size issues
+        memory["tweets"] = memory["tweets"][-MEMORY_WINDOW:]
+        memory["mentions_replied"] = memory["mentions_replied"][-MEMORY_WINDOW:]
+        
+        data = {k: v for k, v in memory.items() if not k.startswith("_")}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def close(self):
+        pass
+
+class SqliteStateStore:
+    """SQLite backend that writes only what changed during a run.
+    
+    Tweets and replied mentions are append-only tables, so history can grow
+    without making a run any slower; `load` reads just the most recent
+    MEMORY_WINDOW rows. Every save is one IMMEDIATE transaction of
+    INSERT OR IGNORE / upserts, so overlapping runs merge their changes
+    instead of overwriting each other. Top-level memory keys without a table
+    of their own are kept as JSON in `meta`; keys starting with "_" are
+    transient and never saved.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tweets (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            type TEXT,
+            timestamp TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tweets_type_idx ON tweets (type, seq);
+        CREATE TABLE IF NOT EXISTS mentions_replied (
+            id TEXT PRIMARY KEY,
+            replied_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS mentions_replied_at_idx ON mentions_replied (replied_at);
+        CREATE TABLE IF NOT EXISTS topics_used (
+            topic TEXT PRIMARY KEY,
+            used_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS last_prices (
+            coin_id TEXT PRIMARY KEY,
+            price REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+    TABLE_KEYS = ("tweets", "mentions_replied", "topics_used", "last_prices", "total_tweets")
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._loaded = {}
+    
+    def load(self):
+        memory = default_memory()
+        rows = self.conn.execute(
+            "SELECT data FROM tweets ORDER BY seq DESC LIMIT ?", (MEMORY_WINDOW,)
+        ).fetchall()
+        memory["tweets"] = [json.loads(data) for (data,) in reversed(rows)]
+        rows = self.conn.execute(
+            "SELECT id FROM mentions_replied ORDER BY replied_at DESC LIMIT ?", (MEMORY_WINDOW,)
+        ).fetchall()
+        memory["mentions_replied"] = [mention_id for (mention_id,) in reversed(rows)]
+        memory["topics_used"] = [
+            topic for (topic,) in self.conn.execute("SELECT topic FROM topics_used ORDER BY used_at")
+        ]
+        memory["last_prices"] = dict(self.conn.execute("SELECT coin_id, price FROM last_prices"))
+        for key, value in self.conn.execute("SELECT key, value FROM meta"):
+            memory[key] = json.loads(value)
+        
+        self._loaded = {
+            "total_tweets": memory.get("total_tweets", 0),
+            "topics_used": list(memory["topics_used"]),
+            "last_prices": dict(memory["last_prices"]),
+            "meta": {k: v for k, v in memory.items() if k not in self.TABLE_KEYS},
+        }
+        return memory
+    
+    def save(self, memory):
+        now = time.time()
+        loaded = self._loaded
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO tweets (id, type, timestamp, data) VALUES (?, ?, ?, ?)",
+                [(str(t["id"]), t.get("type"), t.get("timestamp"), json.dumps(t)) for t in memory["tweets"]]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO mentions_replied (id, replied_at) VALUES (?, ?)",
+                [(str(mention_id), now + i * 1e-6) for i, mention_id in enumerate(memory["mentions_replied"])]
+            )
+            # Dedup lives in the mention index; this table is only a log
+            conn.execute(
+                "DELETE FROM mentions_replied WHERE replied_at < ?",
+                (now - MENTION_INDEX_MAX_AGE_DAYS * 86400,)
+            )
+            
+            topics = memory["topics_used"]
+            if topics != loaded.get("topics_used"):
+                if not set(loaded.get("topics_used", [])) <= set(topics):
+                    # The topic rotation was reset during this run
+                    conn.execute("DELETE FROM topics_used")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO topics_used (topic, used_at) VALUES (?, ?)",
+                    [(topic, now + i * 1e-6) for i, topic in enumerate(topics)]
+                )
+            
+            previous_prices = loaded.get("last_prices", {})
+            conn.executemany(
+                "INSERT INTO last_prices (coin_id, price) VALUES (?, ?) "
+                "ON CONFLICT (coin_id) DO UPDATE SET price = excluded.price",
+                [(coin_id, price) for coin_id, price in memory["last_prices"].items()
+                 if previous_prices.get(coin_id) != price]
+            )
+            
+            # Apply the counter as a delta so overlapping runs add up
+            delta = memory.get("total_tweets", 0) - loaded.get("total_tweets", 0)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('total_tweets', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+                (json.dumps(memory.get("total_tweets", 0)), delta)
+            )
+            
+            previous_meta = loaded.get("meta", {})
+            changed = {
+                key: value for key, value in memory.items()
+                if key not in self.TABLE_KEYS and not key.startswith("_") and previous_meta.get(key) != value
+            }
+            mergeable = [key for key in changed if key in STATE_MERGERS]
+            if mergeable:
+                stored = conn.execute(
+                    f"SELECT key, value FROM meta WHERE key IN ({', '.join('?' * len(mergeable))})", mergeable
+                ).fetchall()
+                for key, value in stored:
+                    value = json.loads(value)
+                    if value != previous_meta.get(key):
+                        # Another run saved this key since we loaded it
+                        changed[key] = memory[key] = STATE_MERGERS[key](previous_meta.get(key), value, changed[key])
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                [(key, json.dumps(value)) for key, value in changed.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        
+        # Everything is on disk now; keep long-lived memory (daemon mode) bounded
+        memory["tweets"] = memory["tweets"][-MEMORY_WINDOW:]
+        memory["mentions_replied"] = memory["mentions_replied"][-MEMORY_WINDOW:]
+        
+        self._loaded = {
+            "total_tweets": memory.get("total_tweets", 0),
+            "topics_used": list(memory["topics_used"]),
+            "last_prices": dict(memory["last_prices"]),
+            "meta": {k: v for k, v in memory.items() if k not in self.TABLE_KEYS},
         }
+    
+    def close(self):
+        self.conn.close()
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """One-shot import of an agent_memory.json file into a SQLite store"""
+    with open(json_path, "r") as f:
+        memory = json.load(f)
+    memory = {**default_memory(), **memory}
+    store = SqliteStateStore(db_path)
+    store.load()
+    store.save(memory)
+    store.close()
+    print(f"Migrated {json_path} into {db_path}")
 
+_state_store = None
+
+def get_state_store():
+    """Return the configured state backend, migrating legacy JSON state on first use.
+    
+    A dry run gets a private in-memory copy of the saved state (or reads the
+    legacy JSON file as is), so nothing on disk is created or changed.
+    """
+    global _state_store
+    if _state_store is None:
+        db_path = state_path(STATE_DB_FILE)
+        json_path = state_path(MEMORY_FILE)
+        if STATE_BACKEND == "json" or (DRY_RUN and not os.path.exists(db_path) and os.path.exists(json_path)):
+            _state_store = JsonStateStore(json_path)
+        elif DRY_RUN:
+            _state_store = SqliteStateStore(":memory:")
+            if os.path.exists(db_path):
+                source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+                source.backup(_state_store.conn)
+                source.close()
+        else:
+            if not os.path.exists(db_path) and os.path.exists(json_path):
+                migrate_json_to_sqlite(json_path, db_path)
+            _state_store = SqliteStateStore(db_path)
+    return _state_store
+
+@traced("load")
+def load_memory():
+    """Load agent memory from the state store"""
+    return get_state_store().load()
+
+@traced("save")
 def save_memory(memory):
-    """Save agent memory to file"""
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
+    """Save agent memory to the state store"""
+    states = {}
+    for key in ("mention_index", "news_index"):
+        if "_" + key in memory:
+            memory[key] = states[key] = memory["_" + key].to_state()
+    get_state_store().save(memory)
+    for key, state in states.items():
+        if memory[key] is not state:
+            # Merged with another run's save: rebuild from the merged state on next use
+            del memory["_" + key]
+    if memory.get("_applied_keys"):
+        # Only now are the delivered posts safely in the state store
+        get_outbox().mark_recorded(memory.pop("_applied_keys"))
+    save_price_history()
+    save_engagement_store()
 
+class MentionDedupIndex:
+    """Fixed-size set of replied mention IDs built from rotating Bloom filters.
+    
+    Lookups and inserts are O(1). A false positive means a mention is
+    skipped, never answered twice.
+    """
+    
+    def __init__(self, capacity=MENTION_INDEX_CAPACITY, error_rate=MENTION_INDEX_ERROR_RATE,
+                 max_age_days=MENTION_INDEX_MAX_AGE_DAYS):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_age = max_age_days * 86400
+        self.num_bits = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        # Newest generation first
+        self.generations = [self._new_generation()]
+    
+    def _new_generation(self):
+        return {"bits": bytearray((self.num_bits + 7) // 8), "count": 0, "started": time.time()}
+    
+    def _positions(self, mention_id):
+        digest = hashlib.blake2b(str(mention_id).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def __contains__(self, mention_id):
+        positions = self._positions(mention_id)
+        return any(
+            all(gen["bits"][p >> 3] & (1 << (p & 7)) for p in positions)
+            for gen in self.generations
+        )
+    
+    def add(self, mention_id):
+        current = self.generations[0]
+        if current["count"] >= self.capacity or time.time() - current["started"] > self.max_age:
+            current = self._new_generation()
+            self.generations = [current, self.generations[0]]
+        for p in self._positions(mention_id):
+            current["bits"][p >> 3] |= 1 << (p & 7)
+        current["count"] += 1
+    
+    def merge(self, other):
+        """Add every ID in another index of the same size, e.g. one an overlapping run saved.
+        
+        Generations started at the same time are OR-ed together; of the
+        rest, the newest two are kept.
+        """
+        if other.num_bits != self.num_bits or other.num_hashes != self.num_hashes:
+            return
+        generations = {gen["started"]: gen for gen in self.generations}
+        for gen in other.generations:
+            mine = generations.get(gen["started"])
+            if mine is None:
+                generations[gen["started"]] = gen
+                continue
+            bits = int.from_bytes(mine["bits"], "little") | int.from_bytes(gen["bits"], "little")
+            mine["bits"] = bytearray(bits.to_bytes(len(mine["bits"]), "little"))
+            mine["count"] = max(mine["count"], gen["count"])
+        self.generations = sorted(generations.values(), key=lambda gen: gen["started"], reverse=True)[:2]
+    
+    def to_state(self):
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "max_age_days": self.max_age / 86400,
+            "generations": [
+                {
+                    "bits": base64.b64encode(zlib.compress(bytes(gen["bits"]))).decode(),
+                    "count": gen["count"],
+                    "started": gen["started"]
+                }
+                for gen in self.generations
+            ]
+        }
+    
+    @classmethod
+    def from_state(cls, state):
+        index = cls(state["capacity"], state["error_rate"], state["max_age_days"])
+        index.generations = [
+            {
+                "bits": bytearray(zlib.decompress(base64.b64decode(gen["bits"]))),
+                "count": gen["count"],
+                "started": gen["started"]
+            }
+            for gen in state["generations"]
+        ]
+        return index
+
+def get_mention_index(memory):
+    """Return the replied-mention index for this memory, building it on first use"""
+    if "_mention_index" not in memory:
+        if memory.get("mention_index"):
+            index = MentionDedupIndex.from_state(memory["mention_index"])
+        else:
+            # Seed from the legacy list of replied IDs
+            index = MentionDedupIndex()
+            for mention_id in memory.get("mentions_replied", []):
+                index.add(mention_id)
+        memory["_mention_index"] = index
+    return memory["_mention_index"]
+
+def mark_mention_replied(memory, mention_id):
+    """Record that a mention has been answered"""
+    get_mention_index(memory).add(mention_id)
+    memory["mentions_replied"].append(str(mention_id))
+
+def advance_mentions_cursor(memory, mentions):
+    """Move the since_id high-water mark past every mention that's been handled.
+    
+    Mention IDs increase over time, so the cursor can go up to just below
+    the oldest mention still waiting for a reply.
+    """
+    if not mentions:
+        return
+    index = get_mention_index(memory)
+    pending = [m["id"] for m in mentions if m["id"] not in index]
+    cursor = min(pending) - 1 if pending else max(m["id"] for m in mentions)
+    memory["mentions_since_id"] = max(cursor, memory.get("mentions_since_id") or 0)
+
+def _merge_cursors(base, theirs, ours):
+    """High-water marks only move forward, so the further one wins"""
+    return max((cursor for cursor in (theirs, ours) if cursor is not None), default=None)
+
+def _merge_mention_indexes(base, theirs, ours):
+    index = MentionDedupIndex.from_state(ours)
+    index.merge(MentionDedupIndex.from_state(theirs))
+    return index.to_state()
+
+STATE_MERGERS["mentions_since_id"] = _merge_cursors
+STATE_MERGERS["mention_index"] = _merge_mention_indexes
+
+class CoinRecord:
+    """Compact market record for one coin.
+    
+    Supports coin["price"]-style access so it can be used anywhere the old
+    per-coin dicts were.
+    """
+    
+    __slots__ = ("id", "name", "symbol", "price", "price_change_24h", "market_cap", "volume")
+    
+    def __init__(self, id, name, symbol, price, price_change_24h, market_cap, volume):
+        self.id = id
+        self.name = name
+        self.symbol = symbol
+        self.price = price
+        self.price_change_24h = price_change_24h
+        self.market_cap = market_cap
+        self.volume = volume
+    
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+    
+    def __repr__(self):
+        return f"CoinRecord({self.id!r}, price={self.price!r})"
+
+@traced("fetch_page")
+def _fetch_market_page(page, per_page):
+    """Fetch one page of the market universe, reusing the parse if it hasn't changed"""
+    params = {
+        "vs_currency": "usd",
+        "order": "market_cap_desc",
+        "per_page": per_page,
+        "page": page,
+        "sparkline": False,
+        "price_change_percentage": "24h"
+    }
+    entry = cached_fetch(COINGECKO_MARKETS_URL, params, endpoint="markets")
+    cached = _market_pages.get(page)
+    if cached and cached[0] == entry.get("digest"):
+        return cached[1]
+    
+    records = [
+        CoinRecord(
+            coin["id"],
+            coin["name"],
+            coin["symbol"].upper(),
+            coin["current_price"],
+            coin["price_change_percentage_24h"],
+            coin["market_cap"],
+            coin["total_volume"]
+        )
+        for coin in entry["body"]
+    ]
+    _market_pages[page] = (entry.get("digest"), records)
+    return records
+
+@traced("fetch")
 def get_crypto_data():
-    """Get cryptocurrency market data from free APIs"""
+    """Get market data for the tracked universe, ordered by market cap.
+    
+    Returns {coin_id: CoinRecord}. Pages are fetched concurrently; a later
+    page that fails is left out rather than failing the whole snapshot, but
+    without page 1 there's no top of the market, so the snapshot is empty.
+    """
     try:
         # CoinGecko API (free tier, no API key needed)
-        url = "https://api.coingecko.com/api/v3/coins/markets"
-        params = {
-            "vs_currency": "usd",
-            "order": "market_cap_desc",
-            "per_page": 15,
-            "page": 1,
-            "sparkline": False,
-            "price_change_percentage": "24h"
-        }
-        response = requests.get(url, params=params)
-        data = response.json()
+        per_page = min(MARKET_PAGE_SIZE, MARKET_UNIVERSE_SIZE)
+        pages = range(1, -(-MARKET_UNIVERSE_SIZE // per_page) + 1)
+        futures = [_page_executor.submit(_fetch_market_page, page, per_page) for page in pages]
         
-        # Format the data
         crypto_data = {}
-        for coin in data:
-            crypto_data[coin["id"]] = {
-                "name": coin["name"],
-                "symbol": coin["symbol"].upper(),
-                "price": coin["current_price"],
-                "price_change_24h": coin["price_change_percentage_24h"],
-                "market_cap": coin["market_cap"],
-                "volume": coin["total_volume"]
-            }
+        for page, future in zip(pages, futures):
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"Error fetching market page {page}: {e}")
+                if page == 1:
+                    return {}
+                continue
+            for record in records:
+                crypto_data.setdefault(record.id, record)
         
         return crypto_data
     except Exception as e:
         print(f"Error fetching crypto data: {e}")
         return {}
 
-def get_crypto_news():
-    """Get cryptocurrency news from free APIs"""
+_MINHASH_PRIME = (1 << 61) - 1
+_minhash_permutations = {}
+
+def text_shingles(text, size=2):
+    """Word `size`-grams of a text, lowercased, ignoring punctuation"""
+    words = re.findall(r"[a-z0-9$%.]+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def minhash_signature(shingles, num_perm):
+    """MinHash signature of a set of shingles: one 32-bit minimum per hash permutation"""
+    if num_perm not in _minhash_permutations:
+        # Fixed seed: signatures are persisted, so they must match across runs
+        rng = random.Random(num_perm)
+        _minhash_permutations[num_perm] = [
+            (rng.randrange(1, _MINHASH_PRIME), rng.randrange(_MINHASH_PRIME)) for _ in range(num_perm)
+        ]
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+        for shingle in shingles
+    ]
+    return tuple(
+        min((a * h + b) % _MINHASH_PRIME for h in hashes) & 0xFFFFFFFF
+        for a, b in _minhash_permutations[num_perm]
+    )
+
+class MinHashIndex:
+    """Bounded near-duplicate index over MinHash signatures.
+    
+    Signatures are split into bands and each band is hashed into a bucket
+    (LSH), so a lookup only compares against entries sharing a bucket rather
+    than the whole index. Past `capacity` entries the oldest is forgotten.
+    """
+    
+    def __init__(self, capacity, num_perm, bands):
+        self.capacity = capacity
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.entries = {}  # key -> signature, oldest first
+        self.buckets = {}
+    
+    def signature(self, text, size=2):
+        return minhash_signature(text_shingles(text, size), self.num_perm)
+    
+    def _band_keys(self, signature):
+        return [(i, signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+    
+    def __contains__(self, key):
+        return key in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def add(self, key, signature):
+        if key in self.entries:
+            return
+        self.entries[key] = signature
+        for band in self._band_keys(signature):
+            self.buckets.setdefault(band, set()).add(key)
+        if len(self.entries) > self.capacity:
+            self.remove(next(iter(self.entries)))
+    
+    def remove(self, key):
+        signature = self.entries.pop(key, None)
+        if signature is None:
+            return
+        for band in self._band_keys(signature):
+            bucket = self.buckets.get(band)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band]
+    
+    def find_similar(self, signature, threshold):
+        """Key of an entry whose estimated Jaccard similarity is at least `threshold`, or None"""
+        candidates = set()
+        for band in self._band_keys(signature):
+            candidates |= self.buckets.get(band, set())
+        for key in candidates:
+            other = self.entries[key]
+            if sum(a == b for a, b in zip(signature, other)) >= threshold * self.num_perm:
+                return key
+        return None
+    
+    def merge(self, other):
+        """Add the entries of another index with the same parameters, oldest first"""
+        if (other.num_perm, other.bands) != (self.num_perm, self.bands):
+            return
+        for key, signature in other.entries.items():
+            self.add(key, signature)
+    
+    def to_state(self):
+        values = [value for signature in self.entries.values() for value in signature]
+        packed = struct.pack(f"<{len(values)}I", *values)
+        return {
+            "capacity": self.capacity,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "keys": list(self.entries),
+            "signatures": base64.b64encode(zlib.compress(packed)).decode()
+        }
+    
+    @classmethod
+    def from_state(cls, state):
+        index = cls(state["capacity"], state["num_perm"], state["bands"])
+        packed = zlib.decompress(base64.b64decode(state["signatures"]))
+        values = struct.unpack(f"<{len(packed) // 4}I", packed)
+        width = index.num_perm
+        for i, key in enumerate(state["keys"]):
+            index.add(key, values[i * width:(i + 1) * width])
+        return index
+
+def get_news_index(memory):
+    """Return the index of news stories already posted, building it on first use"""
+    if "_news_index" not in memory:
+        if memory.get("news_index"):
+            memory["_news_index"] = MinHashIndex.from_state(memory["news_index"])
+        else:
+            memory["_news_index"] = MinHashIndex(NEWS_POSTED_CAPACITY, NEWS_MINHASH_PERMUTATIONS, NEWS_LSH_BANDS)
+    return memory["_news_index"]
+
+def _story_key(url):
+    return hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+
+def ingest_news(memory, stories, now=None):
+    """Merge new stories into memory's ranked queue of unposted news.
+    
+    Stories already posted, already queued, or near-duplicates of either
+    (by title) are dropped. The queue stays newest first, holds at most
+    NEWS_QUEUE_SIZE stories and drops any published more than
+    NEWS_MAX_AGE_HOURS before `now`, even when nothing new arrives.
+    Returns the queue.
+    """
+    cutoff = (time.time() if now is None else now) - NEWS_MAX_AGE_HOURS * 3600
+    posted = get_news_index(memory)
+    queue = [story for story in memory.get("news_queue", []) if story["published_at"] >= cutoff]
+    stories = [story for story in stories if story["published_at"] >= cutoff]
+    queued = MinHashIndex(NEWS_QUEUE_SIZE + len(stories), posted.num_perm, posted.bands)
+    for story in queue:
+        queued.add(_story_key(story["url"]), posted.signature(story["title"]))
+    
+    fresh = []
+    for story in stories:
+        key = _story_key(story["url"])
+        if key in posted or key in queued:
+            continue
+        signature = posted.signature(story["title"])
+        if (posted.find_similar(signature, NEWS_DUPLICATE_THRESHOLD)
+                or queued.find_similar(signature, NEWS_DUPLICATE_THRESHOLD)):
+            continue
+        queued.add(key, signature)
+        fresh.append(story)
+    
+    if fresh:
+        queue = sorted(fresh + queue, key=lambda story: story["published_at"], reverse=True)[:NEWS_QUEUE_SIZE]
+    memory["news_queue"] = queue
+    return queue
+
+def mark_news_posted(memory, story):
+    """Take a story off the queue and remember it was posted"""
+    posted = get_news_index(memory)
+    posted.add(_story_key(story["url"]), posted.signature(story["title"]))
+    memory["news_queue"] = [s for s in memory.get("news_queue", []) if s["url"] != story["url"]]
+
+def _merge_news_indexes(base, theirs, ours):
+    index = MinHashIndex.from_state(ours)
+    index.merge(MinHashIndex.from_state(theirs))
+    return index.to_state()
+
+def _merge_news_queues(base, theirs, ours):
+    """Stories either run queued, minus any either run took off (posted or expired)"""
+    base_urls = {story["url"] for story in base or []}
+    gone = set()
+    for queue in (theirs, ours):
+        gone |= base_urls - {story["url"] for story in queue}
+    stories = {}
+    for story in theirs + ours:
+        if story["url"] not in gone:
+            stories.setdefault(story["url"], story)
+    return sorted(stories.values(), key=lambda story: story["published_at"], reverse=True)[:NEWS_QUEUE_SIZE]
+
+STATE_MERGERS["news_cursor"] = _merge_cursors
+STATE_MERGERS["news_index"] = _merge_news_indexes
+STATE_MERGERS["news_queue"] = _merge_news_queues
+
+@traced("fetch")
+def fetch_news_stories(cursor=0):
+    """Stories from the news feed published at or after `cursor`, newest first.
+    
+    Doesn't touch memory, so it's safe to run on a fetch thread; see
+    apply_news_stories.
+    """
+    # CryptoCompare API (free tier, no API key needed)
+    data = cached_get_json(CRYPTOCOMPARE_NEWS_URL, {"lang": "EN"}, endpoint="news")
+    stories = []
+    for item in data.get("Data") or []:
+        # Newest first: everything from here on was seen by an earlier run
+        if item["published_on"] < cursor:
+            break
+        stories.append({
+            "title": item["title"],
+            "url": item["url"],
+            "source": item["source"],
+            "published_at": item["published_on"]
+        })
+    return stories
+
+def apply_news_stories(memory, stories):
+    """Advance memory's news cursor past `stories` and merge them into the queue"""
+    if stories:
+        memory["news_cursor"] = max(memory.get("news_cursor", 0), stories[0]["published_at"])
+    return ingest_news(memory, stories)
+
+def get_crypto_news(memory=None):
+    """Get fresh crypto news, ranked newest first.
+    
+    Only stories newer than memory's news cursor are read; they're merged
+    into memory's news queue (see ingest_news), which is returned. Without
+    `memory` the stories are just deduplicated against each other.
+    """
+    memory = {} if memory is None else memory
     try:
-        # CryptoCompare API (free tier, no API key needed)
-        url = "https://min-api.cryptocompare.com/data/v2/news/?lang=EN"
-        response = requests.get(url)
-        data = response.json()
-        
-        news_items = []
-        if data.get("Data"):
-            for item in data["Data"][:5]:  # Get top 5 news items
-                news_items.append({
-                    "title": item["title"],
-                    "url": item["url"],
-                    "source": item["source"],
-                    "published_at": item["published_on"]
-                })
-        
-        return news_items
+        return apply_news_stories(memory, fetch_news_stories(memory.get("news_cursor", 0)))
     except Exception as e:
         print(f"Error fetching crypto news: {e}")
         return []
 
-def get_recent_mentions(memory):
-    """Get recent mentions that haven't been replied to yet"""
-    try:
-        mentions = api.mentions_timeline(count=10)
-        replied_ids = memory.get("mentions_replied", [])
-        
-        new_mentions = []
-        for mention in mentions:
-            if str(mention.id) not in replied_ids:
-                new_mentions.append({
-                    "id": mention.id,
-                    "text": mention.text,
-                    "user": mention.user.screen_name,
-                    "created_at": mention.created_at.isoformat()
-                })
-        
-        return new_mentions
-    except Exception as e:
-        print(f"Error fetching mentions: {e}")
-        return []
+@traced("fetch")
+def fetch_mentions(since_id=None):
+    """Mentions newer than `since_id`, as dicts, paging back through the timeline.
+    
+    Doesn't touch memory, so it's safe to run on a fetch thread; see
+    apply_mentions.
+    """
+    params = {"count": MENTIONS_PAGE_SIZE}
+    if since_id:
+        params["since_id"] = since_id
+    
+    # Page backwards with max_id until we reach since_id or run out
+    mentions = []
+    for _ in range(MAX_MENTION_PAGES):
+        page = get_api().mentions_timeline(**params)
+        mentions.extend(page)
+        if len(page) < MENTIONS_PAGE_SIZE:
+            break
+        params["max_id"] = min(mention.id for mention in page) - 1
+    return [
+        {
+            "id": mention.id,
+            "text": mention.text,
+            "user": mention.user.screen_name,
+            "created_at": mention.created_at.isoformat()
+        }
+        for mention in mentions
+    ]
+
+def apply_mentions(memory, mentions):
+    """The fetched mentions that haven't been replied to yet"""
+    replied = get_mention_index(memory)
+    new_mentions = [mention for mention in mentions if mention["id"] not in replied]
+    
+    # Everything fetched was already answered, so skip past it next time
+    if mentions and not new_mentions:
+        memory["mentions_since_id"] = max(mention["id"] for mention in mentions)
+    return new_mentions
+
+def get_recent_mentions(memory):
+    """Get recent mentions that haven't been replied to yet"""
+    try:
+        return apply_mentions(memory, fetch_mentions(memory.get("mentions_since_id")))
+    except Exception as e:
+        print(f"Error fetching mentions: {e}")
+        return []
+
+async def _fetch_source(name, fetch, apply, default, timeout):
+    """Run a blocking fetch on the fetch pool, giving up after `timeout` seconds.
+    
+    `apply` turns the result into the return value on the event loop's
+    thread, and only if the fetch finished in time, so a fetch thread left
+    running after a timeout never writes to memory.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        result = await asyncio.wait_for(loop.run_in_executor(_fetch_executor, fetch), timeout)
+    except asyncio.TimeoutError:
+        print(f"Skipping {name}: no response within {timeout:.1f}s")
+    except Exception as e:
+        print(f"Skipping {name}: {e}")
+    else:
+        return apply(result)
+    return default
+
+async def gather_sources_async(memory, timeout=None, sources=None):
+    """Fetch market data, news and mentions concurrently.
+    
+    `sources` limits the fetch to a subset of "market", "news" and
+    "mentions"; the others come back empty. When market data is fetched
+    too, mentions start as soon as it arrives (overlapping news) and are
+    skipped if it failed, since the run will abort without touching the
+    Twitter API.
+    """
+    timeout = FETCH_TIMEOUT if timeout is None else timeout
+    sources = ("market", "news", "mentions") if sources is None else sources
+    # Fetches only get plain values from memory; results are applied to it here
+    fetches = {
+        "market": ("crypto data", get_crypto_data, lambda data: data, {}),
+        "news": ("crypto news", partial(fetch_news_stories, memory.get("news_cursor", 0)),
+                 partial(apply_news_stories, memory), []),
+        "mentions": ("mentions", partial(fetch_mentions, memory.get("mentions_since_id")),
+                     partial(apply_mentions, memory), []),
+    }
+    
+    def start(source):
+        name, fetch, apply, default = fetches[source]
+        return asyncio.ensure_future(_fetch_source(name, fetch, apply, default, timeout))
+    
+    after_market = "market" in sources and "mentions" in sources
+    tasks = {
+        source: start(source) for source in fetches
+        if source in sources and not (after_market and source == "mentions")
+    }
+    if after_market and await tasks["market"]:
+        tasks["mentions"] = start("mentions")
+    return [await tasks[source] if source in tasks else default
+            for source, (_, _, _, default) in fetches.items()]
+
+def gather_sources(memory, timeout=None, sources=None):
+    """Return (crypto_data, news_items, mentions), fetched concurrently"""
+    return tuple(asyncio.run(gather_sources_async(memory, timeout, sources)))
+
+class PriceHistory:
+    """Ring buffer of prices for every tracked coin.
+    
+    `prices` is a (coins x slots) array whose columns are ticks, with a shared
+    `times` row, so returns, volatility and alerts for all coins come out of
+    a few array operations per tick.
+    """
+    
+    def __init__(self, capacity=PRICE_HISTORY_SLOTS):
+        import numpy as np
+        self.capacity = capacity
+        self.coin_ids = []
+        self.rows = {}
+        self.prices = np.full((0, capacity), np.nan)
+        self.times = np.full(capacity, np.nan)
+        self.head = 0  # next slot to write
+        self.dirty = False
+        self.stamp = None  # of the file this was loaded from or last saved to
+        self._alerts_cache = None
+    
+    def _ensure_rows(self, coin_ids):
+        import numpy as np
+        new_ids = [coin_id for coin_id in coin_ids if coin_id not in self.rows]
+        if not new_ids:
+            return
+        for coin_id in new_ids:
+            self.rows[coin_id] = len(self.coin_ids)
+            self.coin_ids.append(coin_id)
+        if len(self.coin_ids) > self.prices.shape[0]:
+            # Grow geometrically so adding coins one by one stays cheap
+            grown = np.full((max(len(self.coin_ids), 2 * self.prices.shape[0]), self.capacity), np.nan)
+            grown[:self.prices.shape[0]] = self.prices
+            self.prices = grown
+    
+    def latest_time(self):
+        return self.times[(self.head - 1) % self.capacity]
+    
+    def record(self, crypto_data, timestamp=None):
+        """Store one price tick for every coin in `crypto_data`.
+        
+        Recording the same prices again within PRICE_TICK_MIN_SPACING is a
+        no-op, so the tick (and its cached alerts) stays as it was.
+        """
+        import numpy as np
+        timestamp = time.time() if timestamp is None else timestamp
+        self._ensure_rows(crypto_data.keys())
+        rows = np.fromiter((self.rows[coin_id] for coin_id in crypto_data), dtype=np.int64, count=len(crypto_data))
+        values = np.fromiter((coin["price"] or np.nan for coin in crypto_data.values()), dtype=float, count=len(crypto_data))
+        last = self.latest_time()
+        if not np.isnan(last) and timestamp - last < PRICE_TICK_MIN_SPACING:
+            slot = (self.head - 1) % self.capacity
+            if np.array_equal(self.prices[rows, slot], values, equal_nan=True):
+                return
+        else:
+            slot = self.head
+            self.head = (self.head + 1) % self.capacity
+            self.prices[:, slot] = np.nan
+        self.prices[rows, slot] = values
+        self.times[slot] = timestamp
+        self.dirty = True
+        self._alerts_cache = None
+    
+    def _chronological(self):
+        """Slot indices of recorded ticks, oldest first"""
+        import numpy as np
+        order = np.roll(np.arange(self.capacity), -self.head)
+        return order[~np.isnan(self.times[order])]
+    
+    def trend_signals(self, now=None):
+        """Per-window returns (%) and z-scores for every coin.
+        
+        Returns {window: (returns, zscores)}, each an array indexed like
+        `coin_ids`; entries are NaN where there isn't enough history.
+        """
+        import numpy as np
+        now = time.time() if now is None else now
+        n = len(self.coin_ids)
+        order = self._chronological()
+        if n == 0 or len(order) < 2:
+            return {}
+        prices = self.prices[:n][:, order]
+        times = self.times[order]
+        current = prices[:, -1]
+        
+        # Volatility per sqrt(second) from tick-to-tick log returns in the last day
+        recent = times >= now - TREND_WINDOWS["24h"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            log_prices = np.log(prices[:, recent])
+            steps = np.diff(log_prices, axis=1) / np.sqrt(np.diff(times[recent]))
+            samples = np.sum(~np.isnan(steps), axis=1)
+            sigma = np.full(n, np.nan)
+            enough = samples >= TREND_MIN_VOL_SAMPLES
+            if steps.shape[1]:
+                sigma[enough] = np.nanstd(steps[enough], axis=1)
+        
+        signals = {}
+        for label, window in TREND_WINDOWS.items():
+            # Latest tick that is (nearly) a full window old, but not far older
+            anchor = np.searchsorted(times, now - window * TREND_WINDOW_TOLERANCE, side="right") - 1
+            if anchor < 0 or anchor == len(times) - 1:
+                continue
+            elapsed = times[-1] - times[anchor]
+            if elapsed > window / TREND_WINDOW_TOLERANCE:
+                continue
+            with np.errstate(invalid="ignore", divide="ignore"):
+                returns = (current / prices[:, anchor] - 1) * 100
+                zscores = np.log(current / prices[:, anchor]) / (sigma * np.sqrt(elapsed))
+            signals[label] = (returns, zscores)
+        return signals
+    
+    def trend_alerts(self, now=None, coin_ids=None):
+        """Coins with a significant move, strongest first.
+        
+        Each alert is a dict with coin_id, window, change (%) and z (NaN when
+        volatility isn't known yet). Only the strongest window per coin is kept.
+        Results for the current tick are cached until the next `record`.
+        """
+        import numpy as np
+        wanted = None if coin_ids is None else frozenset(coin_ids)
+        if now is None and self._alerts_cache is not None and self._alerts_cache[0] == wanted:
+            return list(self._alerts_cache[1])
+        signals = self.trend_signals(now)
+        if not signals:
+            if now is None:
+                self._alerts_cache = (wanted, [])
+            return []
+        n = len(self.coin_ids)
+        best_score = np.full(n, -np.inf)
+        best = {}
+        for label, (returns, zscores) in signals.items():
+            with np.errstate(invalid="ignore"):
+                significant = (np.abs(returns) >= TREND_MIN_MOVE) & ~(np.abs(zscores) < TREND_Z_THRESHOLD)
+                score = np.where(np.isnan(zscores), np.abs(returns) / TREND_MIN_MOVE, np.abs(zscores))
+            better = significant & (score > best_score)
+            best_score[better] = score[better]
+            for row in np.flatnonzero(better):
+                best[row] = (label, returns[row], zscores[row])
+        
+        alerts = [
+            {"coin_id": self.coin_ids[row], "window": label, "change": float(change), "z": float(z)}
+            for row, (label, change, z) in best.items()
+            if wanted is None or self.coin_ids[row] in wanted
+        ]
+        alerts.sort(key=lambda a: best_score[self.rows[a["coin_id"]]], reverse=True)
+        if now is None:
+            self._alerts_cache = (wanted, alerts)
+        return list(alerts)
+    
+    def merge(self, other):
+        """Fold in the ticks of another history, e.g. one an overlapping run saved.
+        
+        Ticks from both are replayed oldest first with the same rule as
+        `record`, so shared and near-simultaneous ticks collapse into one.
+        """
+        import numpy as np
+        self._ensure_rows(other.coin_ids)
+        n = len(self.coin_ids)
+        mine, theirs = self._chronological(), other._chronological()
+        times = np.concatenate([self.times[mine], other.times[theirs]])
+        prices = np.full((n, len(times)), np.nan)
+        prices[:, :len(mine)] = self.prices[:n][:, mine]
+        prices[[self.rows[coin_id] for coin_id in other.coin_ids], len(mine):] = other.prices[:len(other.coin_ids)][:, theirs]
+        
+        ticks = []
+        for i in np.argsort(times, kind="stable"):
+            if ticks and times[i] - ticks[-1][0] < PRICE_TICK_MIN_SPACING:
+                column = ticks[-1][1]
+                known = ~np.isnan(prices[:, i])
+                column[known] = prices[known, i]
+                ticks[-1] = (times[i], column)
+            else:
+                ticks.append((times[i], prices[:, i].copy()))
+        ticks = ticks[-self.capacity:]
+        
+        self.prices = np.full((n, self.capacity), np.nan)
+        self.times = np.full(self.capacity, np.nan)
+        for slot, (timestamp, column) in enumerate(ticks):
+            self.times[slot] = timestamp
+            self.prices[:, slot] = column
+        self.head = len(ticks) % self.capacity
+        self.dirty = True
+        self._alerts_cache = None
+    
+    def save(self, path):
+        """Write the history, first merging in ticks another run saved since we loaded it"""
+        import numpy as np
+        with _file_lock(path):
+            if _file_stamp(path) not in (None, self.stamp):
+                self.merge(PriceHistory.load(path))
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, coin_ids=np.array(self.coin_ids, dtype=str),
+                     prices=self.prices[:len(self.coin_ids)], times=self.times, head=self.head)
+            os.replace(tmp_path, path)
+            self.stamp = _file_stamp(path)
+        self.dirty = False
+    
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        stamp = _file_stamp(path)
+        with np.load(path) as data:
+            history = cls(capacity=len(data["times"]))
+            history.coin_ids = [str(coin_id) for coin_id in data["coin_ids"]]
+            history.rows = {coin_id: row for row, coin_id in enumerate(history.coin_ids)}
+            history.prices = data["prices"].copy()
+            history.times = data["times"].copy()
+            history.head = int(data["head"])
+        history.stamp = stamp
+        return history
+
+_price_history = None
+
+def get_price_history(memory=None):
+    """Return the price history, loading it on first use.
+    
+    A missing history is seeded from the legacy `last_prices` snapshot so the
+    first run after upgrading can still compare against the previous run.
+    """
+    global _price_history
+    if _price_history is None:
+        path = state_path(PRICE_HISTORY_FILE)
+        try:
+            _price_history = PriceHistory.load(path)
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            _price_history = PriceHistory()
+            if memory and memory.get("last_prices"):
+                try:
+                    seeded_at = datetime.fromisoformat(memory["last_run"]).timestamp()
+                except (KeyError, TypeError, ValueError):
+                    seeded_at = time.time() - TREND_WINDOWS["1h"]
+                _price_history.record(
+                    {coin_id: {"price": price} for coin_id, price in memory["last_prices"].items()},
+                    seeded_at
+                )
+    return _price_history
+
+def save_price_history():
+    """Write the price history if it changed"""
+    if _price_history is not None and _price_history.dirty:
+        _price_history.save(state_path(PRICE_HISTORY_FILE))
+
+def record_price_tick(crypto_data, memory):
+    """Add the latest market snapshot to the price history"""
+    if crypto_data:
+        get_price_history(memory).record(crypto_data)
+
+def _window_label(seconds):
+    """Short label for a time span, like 1h or 25m"""
+    if seconds >= 3600:
+        return f"{seconds / 3600:.0f}h"
+    return f"{max(1, round(seconds / 60))}m"
+
+class CoinWatch:
+    """Incremental alert rules for one coin in watch mode.
+    
+    Each price update is O(1) amortized: `samples` only holds the last
+    WATCH_WINDOW seconds (plus one older sample as the reference price), and
+    level crossings are found by bisecting the sorted levels. A move alert
+    disarms the coin until the move eases below WATCH_REARM_PCT, and no
+    alert of either kind fires within WATCH_COOLDOWN of the last one; a move
+    or crossing during the cooldown is left pending (the coin stays armed and
+    its level zone unchanged) and is reported once the cooldown ends if it
+    still holds.
+    """
+    
+    def __init__(self, coin_id, levels=()):
+        self.coin_id = coin_id
+        self.samples = deque()
+        self.armed = True
+        self.last_alert = float("-inf")
+        self.levels = sorted(levels)
+        self.zone = None  # how many levels are confirmed below the price
+    
+    def _crossings(self, price):
+        if not self.levels:
+            return []
+        if self.zone is None:
+            self.zone = bisect.bisect_right(self.levels, price)
+            return []
+        # A level only counts as crossed once the price clears it by WATCH_LEVEL_BAND
+        above = bisect.bisect_right(self.levels, price / (1 + WATCH_LEVEL_BAND))
+        below = bisect.bisect_left(self.levels, price / (1 - WATCH_LEVEL_BAND))
+        crossed = []
+        if above > self.zone:
+            crossed = [(level, "up") for level in self.levels[self.zone:above]]
+            self.zone = above
+        elif below < self.zone:
+            crossed = [(level, "down") for level in self.levels[below:self.zone]]
+            self.zone = below
+        return crossed
+    
+    def update(self, timestamp, price):
+        """Feed one price; returns the alerts it triggers"""
+        samples = self.samples
+        samples.append((timestamp, price))
+        while len(samples) > 2 and samples[1][0] <= timestamp - WATCH_WINDOW:
+            samples.popleft()
+        ref_time, ref_price = samples[0]
+        change = (price / ref_price - 1) * 100 if ref_price else 0.0
+        
+        if not self.armed and abs(change) < WATCH_REARM_PCT:
+            self.armed = True
+        if timestamp - self.last_alert < WATCH_COOLDOWN:
+            if self.zone is None:
+                self._crossings(price)  # just sets the starting zone
+            return []
+        
+        alerts = []
+        if self.armed and abs(change) >= WATCH_TRIGGER_PCT:
+            self.armed = False
+            alerts.append({"type": "move", "coin_id": self.coin_id, "price": price,
+                           "change": change, "window": timestamp - ref_time})
+        for level, direction in self._crossings(price):
+            alerts.append({"type": "crossing", "coin_id": self.coin_id, "price": price,
+                           "level": level, "direction": direction})
+        if alerts:
+            self.last_alert = timestamp
+        return alerts
+
+def poll_prices(coin_ids, interval=None, stop=None):
+    """Default watch-mode feed: yields (timestamp, {coin_id: price}) ticks.
+    
+    Polls /simple/price (USD only) every `interval` seconds through the
+    response cache, so an unchanged document costs a 304 and yields nothing.
+    Stops when `stop` (a threading.Event) is set.
+    """
+    interval = WATCH_INTERVAL if interval is None else interval
+    params = {"ids": ",".join(coin_ids), "vs_currencies": "usd"}
+    last_digest = None
+    while not (stop and stop.is_set()):
+        started = time.time()
+        try:
+            entry = cached_fetch(COINGECKO_SIMPLE_PRICE_URL, params, endpoint="price")
+            if entry.get("digest") != last_digest:
+                last_digest = entry.get("digest")
+                yield started, {
+                    coin_id: quote["usd"] for coin_id, quote in entry["body"].items() if quote.get("usd")
+                }
+        except Exception as e:
+            print(f"Error polling prices: {e}")
+        wait = max(0.0, interval - (time.time() - started))
+        if stop:
+            stop.wait(wait)
+        else:
+            time.sleep(wait)
+
+# twitter-text v3 counts code points in these ranges as 1 and everything else
+# as 2; URLs count as 23 whatever their length and an emoji sequence as 2
+_LIGHT_RANGES = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+_URL_WEIGHT = 23
+_EMOJI_WEIGHT = 2
+_EMOJI_PART = r"[\u2600-\u27bf\U0001f000-\U0001faff][\ufe0f\U0001f3fb-\U0001f3ff]?"
+_WEIGHTED_TOKEN_RE = re.compile(
+    rf"(?P<url>https?://\S+)|(?P<emoji>{_EMOJI_PART}(?:\u200d{_EMOJI_PART})*)"
+)
+
+_HEAVY_CHAR_RE = re.compile(
+    "[^" + "".join(f"\\U{low:08x}-\\U{high:08x}" for low, high in _LIGHT_RANGES) + "]"
+)
+
+def _char_weight(char):
+    code = ord(char)
+    for low, high in _LIGHT_RANGES:
+        if low <= code <= high:
+            return 1
+    return 2
+
+def _plain_weight(text):
+    if text.isascii():
+        return len(text)
+    return len(text) + len(_HEAVY_CHAR_RE.findall(text))
+
+def tweet_weight(text):
+    """Weighted tweet length under twitter-text rules"""
+    if text.isascii() and "://" not in text:
+        return len(text)
+    weight = 0
+    position = 0
+    for match in _WEIGHTED_TOKEN_RE.finditer(text):
+        weight += _plain_weight(text[position:match.start()])
+        weight += _URL_WEIGHT if match.lastgroup == "url" else _EMOJI_WEIGHT
+        position = match.end()
+    return weight + _plain_weight(text[position:])
+
+def _truncate_to_weight(text, budget, ellipsis="..."):
+    """Shorten text to at most `budget` weight, cutting at a word boundary"""
+    body = text.rstrip()
+    trailing = text[len(body):]
+    budget -= tweet_weight(trailing) + len(ellipsis)
+    if budget <= 0:
+        return ""
+    weight = 0
+    cut = 0
+    for i, char in enumerate(body):
+        weight += _char_weight(char)
+        if weight > budget:
+            break
+        cut = i + 1
+    else:
+        return text
+    shortened = body[:cut]
+    if " " in shortened:
+        shortened = shortened[:shortened.rindex(" ")]
+    return shortened.rstrip(" ,.;:-") + ellipsis + trailing
+
+class Template:
+    """A format string parsed once, ahead of rendering"""
+    
+    __slots__ = ("source", "fields", "text", "weight")
+    
+    def __init__(self, source):
+        self.source = source
+        self.fields = tuple(name for _, name, _, _ in string.Formatter().parse(source) if name)
+        # Static templates are rendered and measured up front
+        self.text = None if self.fields else source.format()
+        self.weight = None if self.fields else tweet_weight(self.text)
+    
+    def render(self, values):
+        if self.text is not None:
+            return self.text
+        return self.source.format_map(values)
+
+class LayoutField:
+    """One piece of a tweet layout.
+    
+    Fields with a `drop` rank are optional and removed (lowest rank first)
+    when the tweet is too long; a `truncate` field is then shortened; an
+    `each` field is rendered once per item in values[each].
+    """
+    
+    __slots__ = ("template", "drop", "truncate", "each")
+    
+    def __init__(self, spec):
+        self.template = Template(spec["template"])
+        self.drop = spec.get("drop")
+        self.truncate = spec.get("truncate", False)
+        self.each = spec.get("each")
+
+def _keyword_trie_regex(words):
+    """Regex alternation for `words`, factored into a trie.
+    
+    The regex engine then branches on one character at each position instead
+    of trying every keyword in turn. A trailing "*" on a word matches any
+    continuation of it.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word.rstrip("*"):
+            node = node.setdefault(char, {})
+        node["*" if word.endswith("*") else ""] = {}
+    
+    def build(node):
+        if "*" in node:
+            # A prefix keyword already covers every longer word below it
+            return r"\w*"
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+    
+    return build(trie)
+
+class IntentClassifier:
+    """Keyword intent matcher compiled into a single regex.
+    
+    `intents` is an ordered table of {"name", "keywords"}; earlier intents
+    win when several match. Keywords match whole words only, so "new"
+    doesn't fire on "renewal"; a trailing "*" matches any word that starts
+    with the keyword ("learn*" covers "learning"). One scan of the text
+    finds every intent present.
+    """
+    
+    def __init__(self, intents):
+        self.names = [intent["name"] for intent in intents]
+        # The intent with no keywords, if any, is what unmatched text gets
+        self.fallback = next((i["name"] for i in intents if not i["keywords"]), None)
+        
+        # One named group per intent, in priority order: at each word the
+        # engine takes the first group that matches, so `lastgroup` is
+        # already the best intent for that word
+        groups = []
+        keywords = []
+        self.ranks = {}
+        for rank, intent in enumerate(intents):
+            words = [word.lower() for word in intent["keywords"] if word.rstrip("*")]
+            if words:
+                group = f"i{rank}"
+                self.ranks[group] = rank
+                groups.append(f"(?P<{group}>" + _keyword_trie_regex(words) + ")")
+                keywords += words
+        # Gate every word on a trie of all the keywords first, so words that
+        # match nothing are rejected in one pass rather than once per intent
+        self.pattern = re.compile(
+            r"\b(?=" + _keyword_trie_regex(keywords) + r"\b)(?:" + "|".join(groups) + r")\b"
+        ) if groups else None
+    
+    def matches(self, text):
+        """All intents found in `text`, highest priority first"""
+        if self.pattern is None:
+            return []
+        ranks = {self.ranks[match.lastgroup] for match in self.pattern.finditer(text.lower())}
+        return [self.names[rank] for rank in sorted(ranks)]
+    
+    def classify(self, text):
+        """The highest-priority intent in `text`, or the fallback intent"""
+        return self.classify_batch([text])[0]
+    
+    def classify_batch(self, texts):
+        """Classify many texts with a single regex scan.
+        
+        The texts are joined with newlines (which are word boundaries, so no
+        keyword can span two texts) and each match is mapped back to its text
+        by offset.
+        """
+        best = [None] * len(texts)
+        ranks = self.ranks
+        if self.pattern is not None and texts:
+            # Lowercase each text first: lower() can change a string's length
+            lowered = [text.lower() for text in texts]
+            starts = []
+            offset = 0
+            for text in lowered:
+                starts.append(offset)
+                offset += len(text) + 1
+            joined = "\n".join(lowered)
+            for match in self.pattern.finditer(joined):
+                i = bisect.bisect_right(starts, match.start()) - 1
+                rank = ranks[match.lastgroup]
+                if best[i] is None or rank < best[i]:
+                    best[i] = rank
+        names = self.names
+        fallback = self.fallback
+        return [fallback if rank is None else names[rank] for rank in best]
+
+def load_content(path=None):
+    """Load every content file under `path`, compiling layouts and reply templates"""
+    path = CONTENT_DIR if path is None else path
+    content = {}
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+            section = json.load(f)
+        section["layout"] = [LayoutField(spec) for spec in section.get("layout", [])]
+        if "intents" in section:
+            for intent in section["intents"]:
+                intent["responses"] = [Template(response) for response in intent["responses"]]
+            section["classifier"] = IntentClassifier(section["intents"])
+        content[name[:-len(".json")]] = section
+    return content
+
+_content = None
+
+def get_content():
+    """Return the content registry, loading it on first use"""
+    global _content
+    if _content is None:
+        _content = load_content()
+    return _content
+
+def fit_tweet(pieces, limit=TWEET_MAX_WEIGHT):
+    """Join rendered layout pieces into a tweet within `limit` weighted chars.
+    
+    `pieces` is a list of (text, weight, field). Optional fields go first,
+    then the truncatable field is cut at a word boundary; only if that's
+    still not enough is the whole text cut.
+    """
+    total = sum(weight for _, weight, _ in pieces)
+    if total <= limit:
+        return "".join(text for text, _, _ in pieces)
+    
+    pieces = list(pieces)
+    for piece in sorted((p for p in pieces if p[2].drop), key=lambda p: p[2].drop):
+        pieces.remove(piece)
+        total -= piece[1]
+        if total <= limit:
+            return "".join(text for text, _, _ in pieces)
+    
+    for i, (text, weight, field) in enumerate(pieces):
+        if field.truncate:
+            shortened = _truncate_to_weight(text, limit - (total - weight))
+            pieces[i] = (shortened, tweet_weight(shortened), field)
+            total += pieces[i][1] - weight
+            break
+    
+    tweet = "".join(text for text, _, _ in pieces)
+    if total > limit:
+        tweet = _truncate_to_weight(tweet, limit)
+    return tweet
+
+def render_tweet(layout, values, limit=TWEET_MAX_WEIGHT):
+    """Render a compiled layout with `values` and fit it to the tweet limit"""
+    pieces = []
+    for field in layout:
+        items = values[field.each] if field.each else (values,)
+        for item in items:
+            text = field.template.render(item)
+            weight = field.template.weight if field.template.text is not None else tweet_weight(text)
+            pieces.append((text, weight, field))
+    return fit_tweet(pieces, limit)
 
+@traced("generate")
 def generate_market_update(crypto_data):
     """Generate a market update tweet"""
+    content = get_content()["market"]
     # Select top 5 cryptocurrencies
     top_coins = list(crypto_data.values())[:5]
     
-    tweet = "🚀 #Crypto Market Update 📊\n\n"
-    
-    for coin in top_coins:
-        emoji = "🟢" if coin["price_change_24h"] > 0 else "🔴"
-        tweet += f"{emoji} #{coin['symbol']}: ${coin['price']:,.2f} ({coin['price_change_24h']:.2f}%)\n"
-    
-    # Add a random insight
-    insights = [
-        "Market sentiment appears cautiously optimistic today.",
-        "Trading volumes remain steady across major exchanges.",
-        "DeFi tokens showing relative strength compared to the broader market.",
-        "Watch for potential breakout patterns forming on several altcoins.",
-        "Funding rates suggest a balanced derivatives market currently.",
-        "On-chain metrics indicate accumulation at these price levels."
+    coins = [
+        {
+            "emoji": "🟢" if coin["price_change_24h"] > 0 else "🔴",
+            "symbol": coin["symbol"],
+            "price": coin["price"],
+            "change": coin["price_change_24h"]
+        }
+        for coin in top_coins
     ]
     
-    tweet += f"\n💡 {random.choice(insights)}\n"
-    tweet += f"\n#cryptocurrency #bitcoin #ethereum"
-    
-    # Ensure within Twitter's character limit
-    if len(tweet) > 280:
-        tweet = tweet[:277] + "..."
-    
-    return tweet
+    return render_tweet(content["layout"], {
+        "coins": coins,
+        "insight": random.choice(content["insights"])
+    })
 
+@traced("generate")
 def generate_news_update(news_items):
     """Generate a news update tweet"""
     if not news_items:
         return None
+    content = get_content()["news"]
     
-    # Select a random news item
-    news = random.choice(news_items)
-    
-    tweet = f"📰 #Crypto News Alert\n\n"
-    tweet += f"{news['title']}\n\n"
+    # The queue is ranked, so the best story is at the head
+    news = news_items[0]
     
-    # Add a brief commentary
-    commentaries = [
-        "This could impact market sentiment in the short term.",
-        "Worth watching how this develops.",
-        "Potentially significant for the ecosystem.",
-        "What are your thoughts on this development?",
-        "This aligns with recent market movements.",
-        "An interesting development for the industry."
-    ]
-    
-    tweet += f"{random.choice(commentaries)}\n\n"
-    tweet += f"Source: {news['source']}"
-    
-    # Ensure within Twitter's character limit
-    if len(tweet) > 280:
-        title_length = 100
-        tweet = f"📰 #Crypto News Alert\n\n{news['title'][:title_length]}...\n\n{random.choice(commentaries)}\n\nSource: {news['source']}"
-        
-        # Truncate further if still too long
-        if len(tweet) > 280:
-            tweet = tweet[:277] + "..."
-    
-    return tweet
+    return render_tweet(content["layout"], {
+        "title": news["title"],
+        "commentary": random.choice(content["commentaries"]),
+        "source": news["source"]
+    })
 
+@traced("generate")
 def generate_educational_content(memory):
     """Generate educational content about crypto"""
-    # List of educational topics
-    topics = [
-        {
-            "topic": "What is #DeFi?",
-            "content": "Decentralized Finance (#DeFi) refers to financial applications built on blockchain technology that aim to replace traditional financial intermediaries with protocol-based relationships. It enables permissionless financial transactions. #CryptoEducation"
-        },
-        {
-            "topic": "Understanding #NFTs",
-            "content": "Non-Fungible Tokens (#NFTs) are unique digital assets verified using blockchain technology. Unlike cryptocurrencies, each NFT has unique properties and isn't interchangeable. They represent ownership of digital or physical items. #CryptoBasics"
-        },
-        {
-            "topic": "What is #HODL?",
-            "content": "HODL is crypto slang for holding onto your assets regardless of price volatility. Originally a typo of 'hold' in a 2013 Bitcoin forum, it's now backronymed to mean 'Hold On for Dear Life'. A long-term investment strategy. #CryptoTerms"
-        },
-        {
-            "topic": "#PoW vs #PoS",
-            "content": "Proof of Work (#PoW) and Proof of Stake (#PoS) are consensus mechanisms. PoW requires solving complex puzzles (mining), while PoS validators are selected based on the number of coins they stake. PoS is more energy-efficient. #BlockchainBasics"
-        },
-        {
-            "topic": "What are #SmartContracts?",
-            "content": "Smart Contracts are self-executing contracts where the terms are directly written into code. They automatically execute when conditions are met, enabling trustless transactions without intermediaries. The foundation of many crypto applications. #Blockchain"
-        },
-        {
-            "topic": "#Layer2 Solutions",
-            "content": "Layer 2 solutions are protocols built on top of existing blockchains (Layer 1) to improve scalability and efficiency. They process transactions off the main chain while inheriting its security, reducing fees and increasing speed. #CryptoInfrastructure"
-        },
-        {
-            "topic": "What is #Staking?",
-            "content": "Staking is the process of locking up cryptocurrency to support network operations in exchange for rewards. It's common in Proof of Stake blockchains, where stakers validate transactions and help secure the network. #PassiveIncome #Crypto"
-        },
-        {
-            "topic": "Understanding #TokenEconomics",
-            "content": "Tokenomics refers to the economic model of a cryptocurrency. It includes supply mechanisms (inflation/deflation), utility, distribution, and incentive structures. Strong tokenomics is crucial for a project's long-term sustainability. #CryptoInvesting"
-        }
-    ]
+    content = get_content()["education"]
+    topics = content["topics"]
     
     # Filter out recently used topics
     used_topics = memory.get("topics_used", [])
@@ -244,262 +2060,1430 @@ def generate_educational_content(memory):
     # Update memory
     memory["topics_used"].append(selected_topic["topic"])
     
-    return selected_topic["content"]
+    return render_tweet(content["layout"], selected_topic)
 
+@traced("generate")
 def generate_trend_analysis(crypto_data, memory):
-    """Generate a trend analysis based on price changes"""
-    # Compare current prices with previous prices
-    last_prices = memory.get("last_prices", {})
+    """Generate a trend analysis from 1h/4h/24h price moves"""
+    content = get_content()["trend"]
+    history = get_price_history(memory)
+    history.record(crypto_data)
     insights = []
     
-    for coin_id, data in crypto_data.items():
-        if coin_id in last_prices:
-            # Calculate price change since last check
-            prev_price = last_prices[coin_id]
-            current_price = data["price"]
-            percent_change = ((current_price - prev_price) / prev_price) * 100
-            
-            # Only include significant changes
-            if abs(percent_change) > 3:
-                direction = "up" if percent_change > 0 else "down"
-                insights.append({
-                    "coin": data["symbol"],
-                    "change": percent_change,
-                    "direction": direction
-                })
-    
-    # Update last prices
-    for coin_id, data in crypto_data.items():
-        last_prices[coin_id] = data["price"]
-    memory["last_prices"] = last_prices
+    for alert in history.trend_alerts(coin_ids=crypto_data.keys()):
+        insights.append({
+            "coin": crypto_data[alert["coin_id"]]["symbol"],
+            "change": alert["change"],
+            "window": alert["window"],
+            "direction": "up" if alert["change"] > 0 else "down"
+        })
+    
+    # Keep the latest snapshot for anything still reading last_prices
+    memory["last_prices"] = {coin_id: data["price"] for coin_id, data in crypto_data.items()}
     
     # Generate tweet if we have insights
     if insights:
-        # Sort by absolute change
-        insights.sort(key=lambda x: abs(x["change"]), reverse=True)
-        
-        # Take top 3
-        top_insights = insights[:3]
-        
-        tweet = "📊 #Crypto Trend Alert 👀\n\n"
-        
-        for insight in top_insights:
-            emoji = "🚀" if insight["direction"] == "up" else "📉"
-            tweet += f"{emoji} #{insight['coin']} has moved {insight['change']:.2f}% {insight['direction']} since my last check\n"
-        
-        # Add a commentary
-        commentaries = [
-            "Keep an eye on these movements as the day progresses.",
-            "Volume suggests this trend might continue in the short term.",
-            "These moves align with broader market sentiment currently.",
-            "Technical indicators suggest watching for potential reversals.",
-            "This volatility presents both risks and opportunities.",
-            "What's your take on these price movements?"
+        # Take the top 3 (alerts come strongest first)
+        lines = [
+            {
+                "emoji": "🚀" if insight["direction"] == "up" else "📉",
+                "coin": insight["coin"],
+                "change": abs(insight["change"]),
+                "direction": insight["direction"],
+                "window": insight["window"]
+            }
+            for insight in insights[:3]
         ]
         
-        tweet += f"\n💭 {random.choice(commentaries)}\n"
-        tweet += f"\n#crypto #trading #marketanalysis"
-        
-        # Ensure within Twitter's character limit
-        if len(tweet) > 280:
-            tweet = tweet[:277] + "..."
-        
-        return tweet
+        return render_tweet(content["layout"], {
+            "insights": lines,
+            "commentary": random.choice(content["commentaries"])
+        })
     
     return None
 
-def respond_to_mention(mention):
-    """Generate a response to a user mention"""
-    # Extract any potential questions or keywords
-    text = mention["text"].lower()
+@traced("generate")
+def generate_price_alert(alerts, symbols):
+    """Generate a price alert tweet from watch-mode alerts (moves and level crossings)"""
+    content = get_content()["alert"]
+    moves = []
+    crossings = []
+    for alert in alerts:
+        symbol = symbols.get(alert["coin_id"], alert["coin_id"].upper())
+        if alert["type"] == "move":
+            moves.append({
+                "emoji": "🚀" if alert["change"] > 0 else "📉",
+                "coin": symbol,
+                "direction": "up" if alert["change"] > 0 else "down",
+                "change": abs(alert["change"]),
+                "window": _window_label(alert["window"]),
+                "price": alert["price"]
+            })
+        else:
+            crossings.append({
+                "emoji": "⬆️" if alert["direction"] == "up" else "⬇️",
+                "coin": symbol,
+                "level": alert["level"]
+            })
     
-    # Check for common crypto questions
-    responses = []
+    return render_tweet(content["layout"], {
+        "moves": moves[:3],
+        "crossings": crossings[:2],
+        "commentary": random.choice(content["commentaries"])
+    })
+
+def respond_to_mention(mention, intent=None):
+    """Generate a response to a user mention.
     
-    if any(word in text for word in ["price", "prediction", "forecast", "going", "moon"]):
-        responses = [
-            f"Hey @{mention['user']}! While I don't make price predictions, the current market conditions suggest watching key support/resistance levels. What's your current strategy? #DYOR",
-            f"Thanks for reaching out @{mention['user']}! Price action is always complex - I focus on fundamentals rather than short-term movements. What specific aspect interests you? #CryptoAnalysis",
-            f"Hi @{mention['user']}! I avoid making price predictions as they're often unreliable. Instead, consider project fundamentals, market cycles, and your risk tolerance. What's your investment horizon? #CryptoAdvice"
-        ]
-    elif any(word in text for word in ["beginner", "start", "new", "learn", "advice"]):
-        responses = [
-            f"Welcome to crypto @{mention['user']}! Start with researching established projects like Bitcoin & Ethereum, use reputable exchanges, and never invest more than you can afford to lose. Any specific questions? #CryptoBasics",
-            f"Hi @{mention['user']}! For beginners, I recommend: 1) Learn blockchain basics 2) Start small 3) Use hardware wallets for security 4) DCA strategy. What area interests you most? #CryptoTips",
-            f"Great to see new people in the space @{mention['user']}! Remember: research thoroughly, secure your assets properly, and think long-term. Would you like resources on any specific topic? #CryptoEducation"
-        ]
-    elif any(word in text for word in ["defi", "yield", "farming", "staking"]):
-        responses = [
-            f"Hey @{mention['user']}! DeFi offers interesting opportunities but comes with risks. Always verify protocols, understand smart contract risks, and start with small amounts. Which platforms are you considering? #DeFi",
-            f"Hi @{mention['user']}! When exploring yield opportunities, security should be your first priority. Established protocols with audits are generally safer, though no guarantee. What's your risk tolerance? #DeFiSafety",
-            f"Thanks for the mention @{mention['user']}! DeFi is evolving rapidly - the key is balancing potential yields against platform risks. Diversification across protocols can help. Any specific yield strategies you're curious about? #DeFiStrategies"
-        ]
-    else:
-        # General responses
-        responses = [
-            f"Thanks for reaching out @{mention['user']}! I'm always happy to discuss crypto markets and technology. Anything specific on your mind? #CryptoCommunity",
-            f"Hey @{mention['user']}! Appreciate the mention. The crypto space is always evolving - what aspects are you currently focused on? #CryptoDiscussion",
-            f"Hi @{mention['user']}! Thanks for connecting. I'm here to share insights on crypto markets and technology. What brought you to the crypto space? #BlockchainTech"
-        ]
+    `intent` skips classification when the caller has already done it.
+    """
+    content = get_content()["mentions"]
+    if intent is None:
+        intent = content["classifier"].classify(mention["text"])
     
-    return random.choice(responses)
+    responses = next(i["responses"] for i in content["intents"] if i["name"] == intent)
+    response = random.choice(responses).render({"user": mention["user"]})
+    return render_tweet(content["layout"], {"response": response})
 
-def post_tweet(content):
-    """Post a tweet and return the tweet ID"""
-    try:
-        response = client.create_tweet(text=content)
-        tweet_id = response.data["id"]
-        print(f"Posted tweet: {content[:50]}...")
-        return tweet_id
-    except Exception as e:
-        print(f"Error posting tweet: {e}")
+@traced("generate")
+def respond_to_mentions(mentions):
+    """Generate replies for a batch of mentions, oldest first, as (mention, intent, reply) triples"""
+    ordered = sorted(mentions, key=lambda m: m["id"])
+    intents = get_content()["mentions"]["classifier"].classify_batch([m["text"] for m in ordered])
+    return [(mention, intent, respond_to_mention(mention, intent)) for mention, intent in zip(ordered, intents)]
+
+class TokenBucket:
+    """Token bucket for post quota that also follows X's rate-limit headers"""
+    
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # epoch seconds, from x-rate-limit-reset
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self):
+        """Seconds until a token is available"""
+        self._refill()
+        blocked = self.blocked_until - time.time()
+        if blocked > 0:
+            return blocked
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+    
+    def update_from_headers(self, headers):
+        """Sync with the server's view of the quota"""
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        if remaining is None:
+            return
+        self._refill()
+        if int(remaining) > 0:
+            self.tokens = min(self.tokens, float(remaining))
+        elif reset:
+            # Out of quota until the window resets
+            self.blocked_until = float(reset)
+
+_reply_bucket = None
+
+def get_reply_bucket():
+    """Return the shared reply rate limiter"""
+    global _reply_bucket
+    if _reply_bucket is None:
+        _reply_bucket = TokenBucket(REPLY_RATE_LIMIT, REPLY_RATE_WINDOW)
+    return _reply_bucket
+
+class Outbox:
+    """Durable queue of outbound tweets and replies.
+    
+    Rows move pending -> sending -> sent (or failed once they run out of
+    attempts). The idempotency key is the primary key, so enqueueing the same
+    post twice is a no-op, and marking an item sent is a single UPDATE.
+    `recorded` flags settled items (sent or failed) that have been applied
+    to memory.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            text TEXT NOT NULL,
+            reply_to TEXT,
+            data TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            claimed_at REAL,
+            tweet_id TEXT,
+            error TEXT,
+            recorded INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS outbox_due_idx ON outbox (status, next_attempt_at);
+    """
+    COLUMNS = ("key", "kind", "text", "reply_to", "data", "attempts", "tweet_id")
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+    
+    def _item(self, row):
+        item = dict(zip(self.COLUMNS, row))
+        item["data"] = json.loads(item["data"])
+        return item
+    
+    def enqueue(self, key, kind, text, reply_to=None, data=None):
+        """Queue a post; returns the status of an existing item with this key, or None"""
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO outbox (key, kind, text, reply_to, data, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, text, None if reply_to is None else str(reply_to), json.dumps(data or {}), now, now)
+            )
+            if cursor.rowcount:
+                return None
+            return self.conn.execute("SELECT status FROM outbox WHERE key = ?", (key,)).fetchone()[0]
+    
+    def status(self, key):
+        """Status of the item with this key, or None if there isn't one"""
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM outbox WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def claim_next(self):
+        """Lease the oldest due pending item for sending, or return None"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT key, kind, text, reply_to, data, attempts, tweet_id FROM outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at, created_at LIMIT 1", (now,)
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE key = ?", (now, row[0])
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self._item(row) if row else None
+    
+    def mark_sent(self, key, tweet_id):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE outbox SET status = 'sent', tweet_id = ?, error = NULL WHERE key = ?",
+                (str(tweet_id), key)
+            )
+    
+    def release(self, key):
+        """Hand a claimed item back without counting an attempt"""
+        with self.lock:
+            self.conn.execute("UPDATE outbox SET status = 'pending' WHERE key = ? AND status = 'sending'", (key,))
+    
+    def reschedule(self, key, error, delay):
+        """Put an item back to try again after `delay` without counting an attempt"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE outbox SET status = 'pending', error = ?, next_attempt_at = ? WHERE key = ?",
+                (error, time.time() + delay, key)
+            )
+    
+    def retry_later(self, key, error, delay):
+        """Count a failed attempt; gives up on the item after OUTBOX_MAX_ATTEMPTS"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, error = ?, next_attempt_at = ?, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END WHERE key = ?",
+                (error, time.time() + delay, OUTBOX_MAX_ATTEMPTS, key)
+            )
+    
+    def mark_failed(self, key, error):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE outbox SET status = 'failed', attempts = attempts + 1, error = ? WHERE key = ?",
+                (error, key)
+            )
+    
+    def expired_claims(self):
+        """Items a crashed process left mid-send"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, kind, text, reply_to, data, attempts, tweet_id FROM outbox "
+                "WHERE status = 'sending' AND claimed_at < ?", (time.time() - OUTBOX_LEASE,)
+            ).fetchall()
+        return [self._item(row) for row in rows]
+    
+    def unrecorded(self):
+        """Settled items (sent, or failed with no tweet_id) not yet applied to memory"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, kind, text, reply_to, data, attempts, tweet_id FROM outbox "
+                "WHERE status IN ('sent', 'failed') AND recorded = 0 ORDER BY claimed_at"
+            ).fetchall()
+        return [self._item(row) for row in rows]
+    
+    def mark_recorded(self, keys):
+        with self.lock:
+            self.conn.executemany("UPDATE outbox SET recorded = 1 WHERE key = ?", [(key,) for key in keys])
+    
+    def has_due(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? LIMIT 1", (time.time(),)
+            ).fetchone() is not None
+    
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+    
+    def prune(self):
+        """Forget settled items older than OUTBOX_RETENTION_DAYS"""
+        cutoff = time.time() - OUTBOX_RETENTION_DAYS * 86400
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM outbox WHERE created_at < ? AND (status = 'failed' OR recorded = 1)", (cutoff,)
+            )
+    
+    def close(self):
+        self.conn.close()
+
+class CircuitBreaker:
+    """Stops sending after repeated failures, then lets one trial through.
+    
+    Closed: everything goes through. After `threshold` consecutive failures
+    the breaker opens for `cooldown` seconds; the next call after that is a
+    trial, and its outcome closes or re-opens the breaker.
+    """
+    
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+    
+    def allow(self):
+        return self.opened_at is None or time.time() - self.opened_at >= self.cooldown
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            if self.opened_at is None:
+                print(f"Circuit breaker open after {self.failures} failed posts, pausing for {self.cooldown:.0f}s")
+            self.opened_at = time.time()
+    
+    def trip(self):
+        """Open the breaker now, as if `threshold` posts had failed in a row"""
+        self.failures = max(self.failures, self.threshold - 1)
+        self.record_failure()
+
+class ContentGuard:
+    """Rolling record of recent posts that catches repeats before they're queued.
+    
+    Every post's normalized text is remembered by hash (exact repeats) in a
+    `post_history` table next to the outbox, and standalone tweets also carry
+    a MinHash signature (near-duplicates) that's mirrored into an in-memory
+    MinHashIndex, so a check costs an indexed lookup plus one LSH probe
+    however long the history. Rows are only ever inserted or deleted, so
+    overlapping runs each see the other's posts instead of overwriting them.
+    Posts older than POST_DUPLICATE_WINDOW_HOURS are forgotten.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS post_history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT NOT NULL UNIQUE,
+            posted_at REAL NOT NULL,
+            signature BLOB
+        );
+        CREATE INDEX IF NOT EXISTS post_history_at_idx ON post_history (posted_at);
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+        self.index = MinHashIndex(POST_NEAR_CAPACITY, POST_MINHASH_PERMUTATIONS, POST_LSH_BANDS)
+        self.indexed = {}  # hash -> posted at for entries of `index`, oldest first
+        self.seq = 0  # last post_history row mirrored into `index`
+    
+    @staticmethod
+    def _hash(text):
+        return hashlib.blake2b(_normalize_post_text(text).lower().encode(), digest_size=8).hexdigest()
+    
+    def _sync(self, cutoff):
+        """Mirror signatures other runs have added into the index and drop expired ones"""
+        rows = self.conn.execute(
+            "SELECT seq, hash, posted_at, signature FROM post_history "
+            "WHERE seq > ? AND signature IS NOT NULL ORDER BY seq", (self.seq,)
+        ).fetchall()
+        for seq, key, posted_at, signature in rows:
+            self.seq = seq
+            if posted_at >= cutoff and key not in self.indexed:
+                self.indexed[key] = posted_at
+                self.index.add(key, struct.unpack(f"<{POST_MINHASH_PERMUTATIONS}I", signature))
+        while self.indexed:
+            key = next(iter(self.indexed))
+            if self.indexed[key] >= cutoff and key in self.index:
+                break
+            del self.indexed[key]
+            self.index.remove(key)
+    
+    def is_duplicate(self, text, near=True, now=None):
+        """Whether `text` repeats a recent post (or, with `near`, almost does)"""
+        cutoff = (time.time() if now is None else now) - POST_DUPLICATE_WINDOW_HOURS * 3600
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM post_history WHERE hash = ? AND posted_at >= ?", (self._hash(text), cutoff)
+            ).fetchone()
+        if row is not None or not near:
+            return row is not None
+        signature = self.index.signature(text)
+        with self.lock:
+            self._sync(cutoff)
+            return self.index.find_similar(signature, POST_DUPLICATE_THRESHOLD) is not None
+    
+    def remember(self, text, near=True, now=None):
+        now = time.time() if now is None else now
+        signature = self.index.signature(text) if near else None
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "DELETE FROM post_history WHERE posted_at < ?", (now - POST_DUPLICATE_WINDOW_HOURS * 3600,)
+                )
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO post_history (hash, posted_at, signature) VALUES (?, ?, ?)",
+                    (self._hash(text), now,
+                     None if signature is None else struct.pack(f"<{len(signature)}I", *signature))
+                )
+                self.conn.execute(
+                    "DELETE FROM post_history WHERE seq <= "
+                    "(SELECT seq FROM post_history ORDER BY seq DESC LIMIT 1 OFFSET ?)", (POST_HASH_CAPACITY,)
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+    
+    def close(self):
+        self.conn.close()
+
+_content_guard = None
+
+def get_content_guard():
+    """Return the guard against repeated posts, opening it on first use.
+    
+    A dry run checks against a private in-memory copy of the post history,
+    so nothing on disk is created or changed.
+    """
+    global _content_guard
+    if _content_guard is None:
+        path = state_path(OUTBOX_DB_FILE)
+        if DRY_RUN:
+            _content_guard = ContentGuard(":memory:")
+            if os.path.exists(path):
+                source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                source.backup(_content_guard.conn)
+                source.close()
+                _content_guard.conn.executescript(ContentGuard.SCHEMA)
+        else:
+            _content_guard = ContentGuard(path)
+    return _content_guard
+
+_outbox = None
+_circuit_breaker = None
+_outbox_reconciled = False
+
+def get_outbox():
+    """Return this account's outbox"""
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(state_path(OUTBOX_DB_FILE))
+    return _outbox
+
+def get_circuit_breaker():
+    """Return the shared posting circuit breaker"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(OUTBOX_BREAKER_THRESHOLD, OUTBOX_BREAKER_COOLDOWN)
+    return _circuit_breaker
+
+def enqueue_post(kind, content, reply_to=None, key=None, regenerate=None, **data):
+    """Queue a tweet (or a reply to `reply_to`) for delivery.
+    
+    Content that repeats a recent post is replaced by calling `regenerate`
+    (up to POST_REGENERATE_ATTEMPTS times) and dropped if it still repeats.
+    The default idempotency key is the kind plus a hash of the text and the
+    duplicate window it falls in, so the same content is never queued twice
+    within a window but can come round again later. Returns the status of an existing
+    item with the same key, "duplicate" if the content was dropped, or None
+    if this one is new.
+    """
+    if key is not None and not DRY_RUN:
+        # Already queued under this key (e.g. a mention fetched twice)
+        status = get_outbox().status(key)
+        if status is not None:
+            return status
+    
+    guard = get_content_guard()
+    near = reply_to is None
+    attempts = 0
+    while guard.is_duplicate(content, near):
+        content = regenerate() if regenerate and attempts < POST_REGENERATE_ATTEMPTS else None
+        attempts += 1
+        if not content:
+            print(f"Dropping {kind}: it repeats a recent post")
+            return "duplicate"
+    
+    if DRY_RUN:
+        print(f"[dry run] {kind}{f' to {reply_to}' if reply_to else ''}:\n{content}")
         return None
+    if key is None:
+        window = int(time.time() // (POST_DUPLICATE_WINDOW_HOURS * 3600))
+        key = f"{kind}:{hashlib.sha1(content.encode()).hexdigest()[:16]}:{window}"
+    status = get_outbox().enqueue(key, kind, content, reply_to, data)
+    if status is None:
+        guard.remember(content, near)
+    return status
+
+def _normalize_post_text(text):
+    """Text as it should compare against our timeline (X rewrites links and escapes &<>)"""
+    text = re.sub(r"https?://\S+", "", text)
+    text = text.replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+    return " ".join(text.split())
 
-def post_reply(content, reply_to_id):
-    """Post a reply to a specific tweet"""
+def reconcile_outbox(outbox):
+    """Settle items a crashed run left mid-send by checking our own timeline.
+    
+    Anything found there is marked sent; the rest goes back in the queue.
+    If the timeline can't be read the items stay put until the next try.
+    """
+    claims = outbox.expired_claims()
+    if not claims:
+        return
     try:
-        response = client.create_tweet(
-            text=content,
-            in_reply_to_tweet_id=reply_to_id
-        )
-        reply_id = response.data["id"]
-        print(f"Posted reply: {content[:50]}...")
-        return reply_id
+        timeline = get_api().user_timeline(count=OUTBOX_RECONCILE_COUNT, tweet_mode="extended")
     except Exception as e:
-        print(f"Error posting reply: {e}")
-        return None
+        print(f"Error reconciling outbox: {e}")
+        return
+    replies = {str(status.in_reply_to_status_id): status.id for status in timeline
+               if status.in_reply_to_status_id}
+    tweets = {_normalize_post_text(status.full_text): status.id for status in timeline}
+    for item in claims:
+        if item["reply_to"]:
+            tweet_id = replies.get(item["reply_to"])
+        else:
+            tweet_id = tweets.get(_normalize_post_text(item["text"]))
+        if tweet_id:
+            outbox.mark_sent(item["key"], tweet_id)
+        else:
+            outbox.release(item["key"])
+    print(f"Reconciled {len(claims)} interrupted posts from the outbox")
 
-def run_bot():
-    """Main function to run the crypto Twitter bot"""
-    print(f"Running crypto bot at {datetime.now().isoformat()}")
+def is_content_rejection(error):
+    """Whether a 4xx from POST /2/tweets rejects the post itself (vs. the account or app)"""
+    status = error.response.status_code
+    if status == 400:
+        return True
+    if status != 403:
+        return False
+    message = " ".join([str(error)] + list(getattr(error, "api_messages", []))).lower()
+    return any(phrase in message for phrase in OUTBOX_CONTENT_REJECTIONS)
+
+def send_post(item, bucket):
+    """Make one POST /2/tweets call for an outbox item and return the tweet ID"""
+    payload = {"text": item["text"]}
+    if item["reply_to"]:
+        payload["reply"] = {"in_reply_to_tweet_id": item["reply_to"]}
+    # Client.request hands back the raw response, so we can read its headers
+    response = get_client().request("POST", "/2/tweets", json=payload, user_auth=True)
+    bucket.update_from_headers(response.headers)
+    return response.json()["data"]["id"]
+
+@traced("post")
+def drain_outbox(deadline=None):
+    """Send due outbox items within the rate budget until the queue or `deadline` runs out.
     
-    # Load memory
-    memory = load_memory()
+    A failed item is rescheduled with exponential backoff and the drain
+    moves on. A 429 waits for the rate-limit reset without using up an
+    attempt, a content rejection fails the item for good, and an auth error
+    opens the breaker with the queue left as it is. Returns the number of
+    posts sent.
+    """
+    global _outbox_reconciled
+    import tweepy
     
-    # Get crypto data
-    crypto_data = get_crypto_data()
-    if not crypto_data:
-        print("Failed to get crypto data, aborting run")
-        return
+    outbox = get_outbox()
+    if not _outbox_reconciled:
+        reconcile_outbox(outbox)
+        outbox.prune()
+        _outbox_reconciled = True
+    bucket = get_reply_bucket()
+    breaker = get_circuit_breaker()
+    sent = 0
+    
+    while breaker.allow() and outbox.has_due():
+        wait = bucket.wait_time()
+        if deadline and time.time() + wait > deadline:
+            print(f"Post quota exhausted for this run, {outbox.pending_count()} posts still queued")
+            break
+        if wait > 0:
+            time.sleep(wait)
+        item = outbox.claim_next()
+        if item is None:
+            break
+        bucket.consume()
+        
+        try:
+            tweet_id = send_post(item, bucket)
+        except tweepy.TooManyRequests as e:
+            bucket.update_from_headers(e.response.headers)
+            outbox.reschedule(item["key"], "rate limited", max(bucket.wait_time(), OUTBOX_BACKOFF_BASE))
+            count_in_span("retries")
+            continue
+        except tweepy.HTTPException as e:
+            status = e.response.status_code
+            if isinstance(e, tweepy.TwitterServerError):
+                error = f"server error {status}"
+            elif is_content_rejection(e):
+                # The post itself was rejected (duplicate, too long, ...); retrying won't help
+                print(f"Post rejected ({status}): {item['text'][:50]}...")
+                outbox.mark_failed(item["key"], f"rejected {status}: {e}")
+                continue
+            elif status in (401, 403):
+                # Credentials or app access: no post will get through until that's fixed
+                print(f"Posting not authorized ({status}: {e}), pausing the outbox")
+                outbox.reschedule(item["key"], f"not authorized {status}", OUTBOX_BREAKER_COOLDOWN)
+                breaker.trip()
+                break
+            else:
+                error = f"client error {status}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        else:
+            outbox.mark_sent(item["key"], tweet_id)
+            breaker.record_success()
+            print(f"Posted {item['kind']}: {item['text'][:50]}...")
+            sent += 1
+            continue
+        
+        delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** item["attempts"]) * random.uniform(0.5, 1.5)
+        print(f"Error posting {item['kind']} ({error}), retrying in {delay:.0f}s")
+        outbox.retry_later(item["key"], error, delay)
+        breaker.record_failure()
+        count_in_span("retries")
+    
+    return sent
+
+def apply_delivered(memory):
+    """Copy posts the outbox has delivered into memory; returns how many.
+    
+    A reply that failed for good still settles its mention, so the mentions
+    cursor can move past it. Items are only flagged recorded in the outbox
+    once save_memory has committed them.
+    """
+    if DRY_RUN:
+        return 0
+    applied = memory.setdefault("_applied_keys", [])
+    items = [item for item in get_outbox().unrecorded() if item["key"] not in applied]
+    delivered = 0
+    for item in items:
+        applied.append(item["key"])
+        if item["tweet_id"] is None:
+            if item["reply_to"]:
+                mark_mention_replied(memory, int(item["reply_to"]))
+            continue
+        record = {
+            "id": item["tweet_id"],
+            "type": item["kind"],
+            "content": item["text"],
+            "timestamp": datetime.now().isoformat()
+        }
+        if item["reply_to"]:
+            record["reply_to"] = int(item["reply_to"])
+            mark_mention_replied(memory, int(item["reply_to"]))
+        record.update(item["data"])
+        memory["tweets"].append(record)
+        memory["total_tweets"] = memory.get("total_tweets", 0) + 1
+        delivered += 1
+    return delivered
+
+class EngagementStore:
+    """Columnar store of public metrics for posted tweets.
+    
+    One row per tweet: `ids`, `types` (an index into `type_names`),
+    `posted_at`, `fetched_at` (NaN until first fetched), `status` (one of
+    the STATUS_* values) and a `metrics` matrix with one column per
+    ENGAGEMENT_METRICS entry. `totals` keeps the sum and sum of squares of
+    engagement scores and the count of measured tweets per type, updated as
+    each row changes, so aggregates never rescan the table.
+    """
+    
+    STATUS_PENDING = 0  # not measured yet
+    STATUS_MEASURED = 1  # metrics are in `totals`
+    STATUS_GONE = 2  # deleted or protected; never requested again
+    
+    def __init__(self):
+        import numpy as np
+        self.size = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.types = np.zeros(0, dtype=np.int16)
+        self.posted_at = np.zeros(0)
+        self.fetched_at = np.zeros(0)
+        self.status = np.zeros(0, dtype=np.int8)
+        self.metrics = np.zeros((0, len(ENGAGEMENT_METRICS)), dtype=np.int64)
+        self.type_names = []
+        self.rows = {}
+        self.totals = {}
+        self.dirty = False
+        self.stamp = None  # of the file this was loaded from or last saved to
+    
+    def _grow(self):
+        import numpy as np
+        capacity = max(64, 2 * len(self.ids))
+        for name in ("ids", "types", "posted_at", "fetched_at", "status", "metrics"):
+            column = getattr(self, name)
+            grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+    
+    def _score(self, row):
+        return sum(int(value) * weight for value, weight in zip(self.metrics[row], ENGAGEMENT_METRICS.values()))
+    
+    def track(self, tweet_id, tweet_type, posted_at):
+        """Add a posted tweet so its metrics get collected"""
+        tweet_id = int(tweet_id)
+        if tweet_id in self.rows:
+            return
+        if tweet_type not in self.type_names:
+            self.type_names.append(tweet_type)
+        if self.size == len(self.ids):
+            self._grow()
+        row = self.size
+        self.size += 1
+        self.rows[tweet_id] = row
+        self.ids[row] = tweet_id
+        self.types[row] = self.type_names.index(tweet_type)
+        self.posted_at[row] = posted_at
+        self.fetched_at[row] = float("nan")
+        self.status[row] = self.STATUS_PENDING
+        self.metrics[row] = 0
+        self.dirty = True
+    
+    def due(self, now, limit):
+        """IDs whose metrics are worth (re)fetching, least recently fetched first"""
+        import numpy as np
+        age = now - self.posted_at[:self.size]
+        fetched = self.fetched_at[:self.size]
+        with np.errstate(invalid="ignore"):
+            stale = np.isnan(fetched) | (now - fetched >= ENGAGEMENT_REFRESH_INTERVAL)
+        mask = (stale & (self.status[:self.size] != self.STATUS_GONE)
+                & (age >= ENGAGEMENT_MIN_AGE) & (age <= ENGAGEMENT_MAX_AGE_DAYS * 86400))
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(np.nan_to_num(fetched[rows], nan=-1.0), kind="stable")[:limit]]
+        return [int(tweet_id) for tweet_id in self.ids[rows]]
+    
+    def update(self, tweet_id, metrics, now):
+        """Store fresh metrics for a tweet (None if it's gone) and adjust the aggregates"""
+        row = self.rows[int(tweet_id)]
+        type_name = self.type_names[self.types[row]]
+        total = self.totals.setdefault(type_name, [0, 0, 0])
+        if self.status[row] == self.STATUS_MEASURED:  # take the old score out
+            score = self._score(row)
+            total[0] -= score
+            total[1] -= score * score
+            total[2] -= 1
+        self.fetched_at[row] = now
+        if metrics is None:
+            # Deleted or protected: out of the aggregates and never requested again
+            self.status[row] = self.STATUS_GONE
+            self.metrics[row] = 0
+        else:
+            self.status[row] = self.STATUS_MEASURED
+            self.metrics[row] = [metrics.get(name, 0) for name in ENGAGEMENT_METRICS]
+            score = self._score(row)
+            total[0] += score
+            total[1] += score * score
+            total[2] += 1
+        self.dirty = True
+    
+    def aggregates(self):
+        """{tweet type: (mean engagement score, score variance, tweets measured)}"""
+        return {
+            type_name: (total / count, max(0.0, squares / count - (total / count) ** 2), count)
+            for type_name, (total, squares, count) in self.totals.items() if count
+        }
+    
+    def merge(self, other):
+        """Fold in another store's rows, e.g. one an overlapping run saved.
+        
+        Tweets only the other store tracks are added; for tweets both track,
+        whichever copy was fetched more recently wins.
+        """
+        import numpy as np
+        for row in range(other.size):
+            tweet_id = int(other.ids[row])
+            self.track(tweet_id, other.type_names[other.types[row]], other.posted_at[row])
+            mine = self.rows[tweet_id]
+            theirs = other.fetched_at[row]
+            if not np.isnan(theirs) and not self.fetched_at[mine] >= theirs:
+                self.fetched_at[mine] = theirs
+                self.status[mine] = other.status[row]
+                self.metrics[mine] = other.metrics[row]
+        self._recount()
+        self.dirty = True
+    
+    def _recount(self):
+        """Rebuild `totals` from the measured rows"""
+        import numpy as np
+        measured = self.status[:self.size] == self.STATUS_MEASURED
+        scores = self.metrics[:self.size] @ np.array(list(ENGAGEMENT_METRICS.values()), dtype=np.int64)
+        types = self.types[:self.size][measured]
+        sums = np.bincount(types, weights=scores[measured], minlength=len(self.type_names))
+        squares = np.bincount(types, weights=scores[measured] ** 2, minlength=len(self.type_names))
+        counts = np.bincount(types, minlength=len(self.type_names))
+        self.totals = {
+            type_name: [int(sums[i]), int(squares[i]), int(counts[i])]
+            for i, type_name in enumerate(self.type_names)
+        }
+    
+    def save(self, path):
+        """Write the store, first merging in rows another run saved since we loaded it"""
+        import numpy as np
+        with _file_lock(path):
+            if _file_stamp(path) not in (None, self.stamp):
+                self.merge(EngagementStore.load(path))
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, ids=self.ids[:self.size], types=self.types[:self.size],
+                     posted_at=self.posted_at[:self.size], fetched_at=self.fetched_at[:self.size],
+                     status=self.status[:self.size], metrics=self.metrics[:self.size], type_names=np.array(self.type_names, dtype=str))
+            os.replace(tmp_path, path)
+            self.stamp = _file_stamp(path)
+        self.dirty = False
+    
+    @classmethod
+    def load(cls, path):
+        """Load the store, dropping tweets older than ENGAGEMENT_RETENTION_DAYS"""
+        import numpy as np
+        store = cls()
+        store.stamp = _file_stamp(path)
+        with np.load(path) as data:
+            keep = data["posted_at"] >= time.time() - ENGAGEMENT_RETENTION_DAYS * 86400
+            store.ids = data["ids"][keep]
+            store.types = data["types"][keep]
+            store.posted_at = data["posted_at"][keep]
+            store.fetched_at = data["fetched_at"][keep]
+            if "status" in data.files:
+                store.status = data["status"][keep]
+            else:
+                # Stores saved before the status column: anything fetched was measured
+                store.status = np.where(np.isnan(store.fetched_at), cls.STATUS_PENDING,
+                                        cls.STATUS_MEASURED).astype(np.int8)
+            store.metrics = data["metrics"][keep]
+            store.type_names = [str(name) for name in data["type_names"]]
+        store.size = len(store.ids)
+        store.rows = {int(tweet_id): row for row, tweet_id in enumerate(store.ids)}
+        store._recount()
+        return store
+
+_engagement_store = None
+
+def get_engagement_store():
+    """Return the engagement store, loading it on first use"""
+    global _engagement_store
+    if _engagement_store is None:
+        path = state_path(ENGAGEMENT_FILE)
+        _engagement_store = EngagementStore.load(path) if os.path.exists(path) else EngagementStore()
+    return _engagement_store
+
+def save_engagement_store():
+    """Write the engagement store back if it changed"""
+    if _engagement_store is not None and _engagement_store.dirty:
+        _engagement_store.save(state_path(ENGAGEMENT_FILE))
+
+@traced("fetch")
+def collect_engagement(memory, max_requests=ENGAGEMENT_MAX_REQUESTS):
+    """Refresh public metrics for recent tweets, 100 IDs per request.
+    
+    Only tweets that are old enough to have settled and haven't been
+    measured for ENGAGEMENT_REFRESH_INTERVAL are looked up, so most runs
+    make no request at all. Returns the number of tweets refreshed.
+    """
+    store = get_engagement_store()
+    for tweet in memory.get("tweets", []):
+        if tweet.get("id") and tweet.get("timestamp"):
+            store.track(tweet["id"], tweet["type"], datetime.fromisoformat(tweet["timestamp"]).timestamp())
+    
+    now = time.time()
+    ids = store.due(now, max_requests * ENGAGEMENT_BATCH_SIZE)
+    refreshed = 0
+    for start in range(0, len(ids), ENGAGEMENT_BATCH_SIZE):
+        batch = ids[start:start + ENGAGEMENT_BATCH_SIZE]
+        try:
+            response = get_client().get_tweets(ids=batch, tweet_fields=["public_metrics"], user_auth=True)
+        except Exception as e:
+            print(f"Error fetching tweet metrics: {e}")
+            break
+        found = {int(tweet.id): tweet.public_metrics for tweet in response.data or []}
+        for tweet_id in batch:
+            store.update(tweet_id, found.get(tweet_id), now)
+        refreshed += len(found)
+    return refreshed
+
+class ActionBandit:
+    """Picks run_bot's next action from stored outcomes, freshness and post budget.
     
-    # Get news
-    news_items = get_crypto_news()
+    Rewards come from the engagement store, so the only state of its own is
+    how often and when each action was last picked (`pulls`, `last`), kept
+    in memory["bandit"]. A selection is a handful of float operations per
+    action.
+    """
     
-    # Get mentions
-    mentions = get_recent_mentions(memory)
+    def __init__(self, policy=None, state=None):
+        self.policy = ACTION_POLICY if policy is None else policy
+        state = state or {}
+        self.pulls = dict(zip(ACTION_TWEET_TYPES, state.get("pulls", ())))
+        self.last = dict(zip(ACTION_TWEET_TYPES, state.get("last", ())))
     
-    # Decide what kind of content to post
-    action = random.choice(["market", "news", "education", "trend", "engage"])
-    tweet_id = None
+    def _values(self, actions, aggregates):
+        """Learned value of each action under the policy"""
+        stats = [aggregates.get(ACTION_TWEET_TYPES[action], (0.0, 0.0, 0)) for action in actions]
+        measured = sum(count for _, _, count in stats)
+        if measured:
+            overall = sum(mean * count for mean, _, count in stats) / measured
+            pooled = sum((var + mean * mean) * count for mean, var, count in stats) / measured - overall ** 2
+            scale = math.sqrt(max(pooled, 1e-9))
+        else:
+            overall, scale = 1.0, 1.0
+        
+        values = []
+        total_pulls = sum(self.pulls.get(action, 0) for action in actions) + 1
+        for action, (mean, _, count) in zip(actions, stats):
+            shrunk = (mean * count + overall * BANDIT_PRIOR) / (count + BANDIT_PRIOR)
+            if self.policy == "ucb":
+                pulls = self.pulls.get(action, 0)
+                bonus = math.inf if pulls == 0 else BANDIT_UCB_C * scale * math.sqrt(2 * math.log(total_pulls) / pulls)
+                values.append(shrunk + bonus)
+            else:
+                values.append(random.gauss(shrunk, scale / math.sqrt(count + BANDIT_PRIOR)))
+        return values
+    
+    def select(self, freshness, costs, scarcity, aggregates, now=None):
+        """Best action among those with anything to post.
+        
+        `freshness` maps action -> multiplier (0 = nothing worth posting),
+        `costs` maps action -> posts it would use and `scarcity` (0-1) is how
+        short the post budget is.
+        """
+        now = time.time() if now is None else now
+        actions = [action for action in ACTION_TWEET_TYPES if freshness.get(action, 0) > 0]
+        if not actions:
+            return "education"
+        best, best_score = actions[0], -math.inf
+        for action, value in zip(actions, self._values(actions, aggregates)):
+            score = max(value, 1e-9) * freshness[action] / costs.get(action, 1) ** scarcity
+            if score > best_score:
+                best, best_score = action, score
+        self.pulls[best] = self.pulls.get(best, 0) + 1
+        self.last[best] = now
+        return best
+    
+    def to_state(self):
+        return {
+            "pulls": [self.pulls.get(action, 0) for action in ACTION_TWEET_TYPES],
+            "last": [round(self.last.get(action, 0)) for action in ACTION_TWEET_TYPES]
+        }
+
+def _merge_bandit_states(base, theirs, ours):
+    """Add up the picks both runs made and keep the latest time of each"""
+    base = base or {}
+    width = len(ACTION_TWEET_TYPES)
+    def column(state, name):
+        return (list(state.get(name, ())) + [0] * width)[:width]
+    
+    return {
+        "pulls": [t + o - b for b, t, o in zip(column(base, "pulls"), column(theirs, "pulls"), column(ours, "pulls"))],
+        "last": [max(t, o) for t, o in zip(column(theirs, "last"), column(ours, "last"))]
+    }
+
+STATE_MERGERS["bandit"] = _merge_bandit_states
+
+def action_freshness(bandit, crypto_data, news_items, mentions, now):
+    """How much each action has to say right now (0 = nothing, 1 = fully fresh)"""
+    def hours_since(action):
+        return (now - bandit.last.get(action, 0)) / 3600
+    
+    freshness = {
+        "market": min(1.0, hours_since("market") / BANDIT_MARKET_REFRESH_HOURS),
+        "education": min(1.0, hours_since("education") / BANDIT_EDUCATION_REFRESH_HOURS),
+        "news": 0.0,
+        "trend": 0.0,
+        "engage": 0.0,
+    }
+    if news_items:
+        # Decays with age and reaches 0 once the story is too old to post
+        age_hours = max(0.0, now - news_items[0]["published_at"]) / 3600
+        decay = 0.5 + 0.5 * 0.5 ** (age_hours / BANDIT_NEWS_HALF_LIFE_HOURS)
+        freshness["news"] = max(0.0, 1 - age_hours / NEWS_MAX_AGE_HOURS) * decay
+    if crypto_data and get_price_history().trend_alerts(coin_ids=crypto_data.keys()):
+        freshness["trend"] = 1.0
+    if mentions:
+        freshness["engage"] = 1.0 + BANDIT_MENTION_URGENCY * min(1.0, len(mentions) / 10)
+    return freshness
+
+def post_budget_scarcity():
+    """0 when the post quota is untouched, 1 when it's used up or the outbox is backed up"""
+    bucket = get_reply_bucket()
+    bucket._refill()
+    used = 1 - bucket.tokens / bucket.capacity
+    backlog = get_outbox().pending_count() / bucket.capacity
+    return min(1.0, max(used, backlog))
+
+def choose_action(memory, crypto_data, news_items, mentions):
+    """Pick this run's action with the bandit and remember the choice in memory"""
+    now = time.time()
+    bandit = ActionBandit(state=memory.get("bandit"))
+    freshness = action_freshness(bandit, crypto_data, news_items, mentions, now)
+    costs = {"engage": max(1, len(mentions))}
+    scarcity = 0.0 if DRY_RUN else post_budget_scarcity()
+    action = bandit.select(freshness, costs, scarcity, get_engagement_store().aggregates(), now)
+    memory["bandit"] = bandit.to_state()
+    return action
+
+def deliver_posts(memory, mentions=(), deadline=None):
+    """Drain the outbox, record what was delivered and move the mentions cursor"""
+    if not DRY_RUN:
+        drain_outbox(deadline)
+    apply_delivered(memory)
+    # Fetch only newer mentions next time
+    advance_mentions_cursor(memory, mentions)
+
+def queue_replies(memory, mentions):
+    """Queue a reply to every unanswered mention; returns how many were queued.
     
-    # Override with engagement if there are new mentions
-    if mentions and random.random() < 0.8:  # 80% chance to respond if there are mentions
-        action = "engage"
+    Each mention's reply is keyed by the mention ID, so a mention that's
+    fetched again before its reply is recorded is never answered twice.
+    """
+    queued = 0
+    for mention, intent, content in respond_to_mentions(mentions):
+        status = enqueue_post("reply", content, reply_to=mention["id"], key=f"reply:{mention['id']}",
+                              regenerate=partial(respond_to_mention, mention, intent),
+                              reply_to_user=mention["user"])
+        if status is None:
+            queued += 1
+        elif status in ("sent", "failed", "duplicate"):
+            # Answered by a run that died before saving memory, rejected for
+            # good, or every reply we have would repeat one sent recently
+            mark_mention_replied(memory, mention["id"])
+    return queued
+
+def run_action(action, memory, crypto_data, news_items, mentions, fallback=True):
+    """Generate content for one action and queue it in the outbox.
+    
+    With `fallback`, a trend action that finds no significant moves posts a
+    market update instead. Returns the number of posts queued; they're sent
+    by drain_outbox and recorded in memory by apply_delivered.
+    """
+    generate = None
+    kind = None
+    queued = 0
+    topics_used = list(memory.get("topics_used", []))
     
-    # Execute selected action
     if action == "market":
-        content = generate_market_update(crypto_data)
-        tweet_id = post_tweet(content)
-        if tweet_id:
-            memory["tweets"].append({
-                "id": tweet_id,
-                "type": "market_update",
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            })
+        generate, kind = partial(generate_market_update, crypto_data), "market_update"
     
     elif action == "news" and news_items:
-        content = generate_news_update(news_items)
-        if content:
-            tweet_id = post_tweet(content)
-            if tweet_id:
-                memory["tweets"].append({
-                    "id": tweet_id,
-                    "type": "news",
-                    "content": content,
-                    "timestamp": datetime.now().isoformat()
-                })
+        generate, kind = partial(generate_news_update, news_items), "news"
+        mark_news_posted(memory, news_items[0])
     
     elif action == "education":
-        content = generate_educational_content(memory)
-        tweet_id = post_tweet(content)
-        if tweet_id:
-            memory["tweets"].append({
-                "id": tweet_id,
-                "type": "education",
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            })
+        generate, kind = partial(generate_educational_content, memory), "education"
     
     elif action == "trend":
-        content = generate_trend_analysis(crypto_data, memory)
-        if content:
-            tweet_id = post_tweet(content)
-            if tweet_id:
-                memory["tweets"].append({
-                    "id": tweet_id,
-                    "type": "trend_analysis",
-                    "content": content,
-                    "timestamp": datetime.now().isoformat()
-                })
-        else:
-            # Fallback to market update if no trends detected
-            content = generate_market_update(crypto_data)
-            tweet_id = post_tweet(content)
-            if tweet_id:
-                memory["tweets"].append({
-                    "id": tweet_id,
-                    "type": "market_update",
-                    "content": content,
-                    "timestamp": datetime.now().isoformat()
-                })
-    
-    elif action == "engage" and mentions:
-        # Respond to the first unaddressed mention
-        mention = mentions[0]
-        content = respond_to_mention(mention)
-        reply_id = post_reply(content, mention["id"])
-        
-        if reply_id:
-            # Record the reply
-            memory["mentions_replied"].append(str(mention["id"]))
-            # Keep the list manageable
-            if len(memory["mentions_replied"]) > 100:
-                memory["mentions_replied"] = memory["mentions_replied"][-100:]
-            
-            memory["tweets"].append({
-                "id": reply_id,
-                "type": "reply",
-                "content": content,
-                "reply_to": mention["id"],
-                "reply_to_user": mention["user"],
-                "timestamp": datetime.now().isoformat()
-            })
+        generate, kind = partial(generate_trend_analysis, crypto_data, memory), "trend_analysis"
     
-    # Update total tweets count if we posted something
-    if tweet_id:
-        memory["total_tweets"] = memory.get("total_tweets", 0) + 1
+    content = generate() if generate else None
+    if action == "trend" and not content and fallback:
+        # Fallback to market update if no trends detected
+        generate, kind = partial(generate_market_update, crypto_data), "market_update"
+        content = generate()
+    
+    if action == "engage" and mentions:
+        # Work through the whole backlog of unanswered mentions
+        queued = queue_replies(memory, mentions)
+        print(f"Queued replies to {queued} of {len(mentions)} mentions")
+    
+    # A repeat of a recent post is regenerated (another insight, topic or commentary)
+    if content:
+        status = enqueue_post(kind, content, regenerate=generate)
+        if status is None:
+            queued += 1
+        elif status == "duplicate":
+            # Nothing was posted, so the topics tried aren't used up
+            memory["topics_used"] = topics_used
+    
+    return queued
+
+def run_bot(snapshot=None):
+    """Main function to run the crypto Twitter bot.
+    
+    `snapshot` is a pre-fetched (crypto_data, news_items) pair shared between
+    accounts; when given, only this account's mentions are fetched.
+    """
+    print(f"Running crypto bot at {datetime.now().isoformat()}")
+    reset_metrics()
+    
+    # Load memory
+    memory = load_memory()
+    
+    # Get crypto data, news and mentions at the same time. Mentions need the
+    # Twitter API, so they only start once market data is in (an aborted run
+    # doesn't load tweepy) and a dry run never fetches them.
+    if snapshot is None:
+        sources = ("market", "news") if DRY_RUN else None
+        crypto_data, news_items, mentions = gather_sources(memory, sources=sources)
+    else:
+        crypto_data, news_items = snapshot
+        news_items = ingest_news(memory, news_items)
+        mentions = [] if DRY_RUN else gather_sources(memory, sources=("mentions",))[2]
+    if not crypto_data:
+        print("Failed to get crypto data, aborting run")
+        export_metrics()
+        return
+    record_price_tick(crypto_data, memory)
+    
+    # Decide what kind of content to post from what has worked before and what's fresh
+    if not DRY_RUN:
+        collect_engagement(memory)
+    action = choose_action(memory, crypto_data, news_items, mentions)
+    
+    run_action(action, memory, crypto_data, news_items, mentions)
+    # Also retries anything an earlier run couldn't deliver
+    deliver_posts(memory, mentions, deadline=time.time() + ENGAGE_DEADLINE)
     
     # Update last run time
     memory["last_run"] = datetime.now().isoformat()
     
-    # Trim tweets history to prevent file size issues
-    if len(memory["tweets"]) > 100:
-        memory["tweets"] = memory["tweets"][-100:]
-    
-    # Save updated memory
-    save_memory(memory)
+    # Save updated memory (a dry run leaves state untouched)
+    if not DRY_RUN:
+        save_memory(memory)
     
+    export_metrics()
     print(f"Bot run completed at {datetime.now().isoformat()}")
     print("-" * 40)
 
+def run_tick(action, memory):
+    """Run one scheduled action in daemon mode, reusing the loaded memory"""
+    print(f"Running {action} tick at {datetime.now().isoformat()}")
+    reset_metrics()
+    crypto_data, news_items, mentions = gather_sources(memory, sources=ACTION_SOURCES[action])
+    if "market" in ACTION_SOURCES[action] and not crypto_data:
+        print(f"Failed to get crypto data, skipping {action} tick")
+        export_metrics()
+        return
+    record_price_tick(crypto_data, memory)
+    
+    run_action(action, memory, crypto_data, news_items, mentions, fallback=False)
+    collect_engagement(memory)
+    # The outbox worker thread sends; record whatever it has delivered so far
+    apply_delivered(memory)
+    advance_mentions_cursor(memory, mentions)
+    memory["last_run"] = datetime.now().isoformat()
+    save_memory(memory)
+    export_metrics()
+
+def run_outbox_worker(stop, wake):
+    """Daemon thread: drain the outbox whenever `wake` is set, or every OUTBOX_DRAIN_INTERVAL"""
+    while not stop.is_set():
+        wake.clear()
+        try:
+            drain_outbox(deadline=time.time() + OUTBOX_DRAIN_INTERVAL)
+        except Exception as e:
+            print(f"Error draining outbox: {e}")
+        wake.wait(OUTBOX_DRAIN_INTERVAL)
+
+def run_daemon():
+    """Run the bot as a long-lived process with a per-action schedule.
+    
+    Clients, HTTP connections, caches and memory stay warm between ticks, so
+    start-up is paid once. Posts are delivered by a background outbox worker,
+    so a slow or failing API never holds up the schedule. SIGINT/SIGTERM stop
+    the loop after the current tick and flush state before exiting.
+    """
+    import schedule
+    
+    print(f"Starting crypto bot daemon at {datetime.now().isoformat()}")
+    memory = load_memory()
+    stop = threading.Event()
+    wake = threading.Event()
+    get_outbox()  # open it before the worker thread needs it
+    worker = threading.Thread(target=run_outbox_worker, args=(stop, wake), name="outbox", daemon=True)
+    worker.start()
+    
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, shutting down")
+        stop.set()
+        wake.set()
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    def tick(action):
+        try:
+            run_tick(action, memory)
+        except Exception as e:
+            print(f"Error during {action} tick: {e}")
+        wake.set()
+    
+    for action, (low, high) in DAEMON_CADENCES.items():
+        schedule.every(low).to(high).minutes.do(tick, action)
+    
+    while not stop.is_set():
+        schedule.run_pending()
+        # Sleep until the next job is due, waking immediately on shutdown
+        idle = schedule.idle_seconds()
+        stop.wait(60 if idle is None else min(max(idle, 1), 60))
+    
+    schedule.clear()
+    worker.join(OUTBOX_DRAIN_INTERVAL)
+    apply_delivered(memory)
+    save_memory(memory)
+    get_state_store().close()
+    get_outbox().close()
+    print("Daemon stopped, state saved")
+
+def run_watcher(feed=None):
+    """Post price alerts within seconds of a move instead of waiting for a scheduled run.
+    
+    `feed` is any iterable of (timestamp, {coin_id: price}) ticks; by default
+    it polls prices for the WATCH_TOP_N largest coins, but a websocket
+    client (or a local stand-in) can be plugged in instead. Each tick only
+    updates the coins it mentions. SIGINT/SIGTERM stop after the current tick.
+    """
+    print(f"Starting price watcher at {datetime.now().isoformat()}")
+    memory = load_memory()
+    stop = threading.Event()
+    
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, shutting down")
+        stop.set()
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    # One market fetch up front for the symbols (and the default watch list)
+    crypto_data = get_crypto_data()
+    symbols = {coin_id: coin["symbol"] for coin_id, coin in crypto_data.items()}
+    if feed is None:
+        if not crypto_data:
+            print("Failed to get crypto data, can't pick coins to watch")
+            return
+        coin_ids = list(crypto_data)[:WATCH_TOP_N]
+        print(f"Watching {len(coin_ids)} coins every {WATCH_INTERVAL:.0f}s")
+        feed = poll_prices(coin_ids, stop=stop)
+    
+    watches = {}
+    for timestamp, prices in feed:
+        alerts = []
+        for coin_id, price in prices.items():
+            watch = watches.get(coin_id)
+            if watch is None:
+                watch = watches[coin_id] = CoinWatch(coin_id, WATCH_LEVELS.get(coin_id, ()))
+            alerts.extend(watch.update(timestamp, price))
+        
+        if alerts:
+            reset_metrics()
+            print(f"{len(alerts)} price alerts at {datetime.now().isoformat()}")
+            enqueue_post("price_alert", generate_price_alert(alerts, symbols),
+                         regenerate=partial(generate_price_alert, alerts, symbols))
+            deliver_posts(memory, deadline=time.time() + WATCH_INTERVAL)
+            if not DRY_RUN:
+                save_memory(memory)
+            export_metrics()
+        if stop.is_set():
+            break
+    
+    if not DRY_RUN:
+        save_memory(memory)
+    print("Watcher stopped")
+
+def load_accounts(path):
+    """Read the multi-account config: a JSON list of account objects.
+    
+    Each account needs a "name". Optional keys:
+      env_prefix        prefix for its TWITTER_* variables (e.g. "ALT_" reads
+                        ALT_TWITTER_CONSUMER_KEY); defaults to the unprefixed ones
+      state_dir         where its state lives (default accounts/<name>)
+      content_dir       persona-specific content files
+      reply_rate_limit  replies per 15 minutes
+      engage_deadline   seconds an engage run may spend replying
+      metrics_file      where its run metrics go (default METRICS_FILE with
+                        the account name appended)
+    
+    Relative directories are resolved against the config file's location.
+    """
+    with open(path, "r") as f:
+        accounts = json.load(f)
+    names = [account["name"] for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate account names in {path}")
+    
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for account in accounts:
+        account.setdefault("state_dir", os.path.join("accounts", account["name"]))
+        for key in ("state_dir", "content_dir", "metrics_file"):
+            if key in account:
+                account[key] = os.path.join(base_dir, account[key])
+    return accounts
+
+def configure_account(account):
+    """Point this process's clients, state and budgets at one account"""
+    global TWITTER_CREDENTIALS, DRY_RUN, STATE_DIR, CONTENT_DIR, REPLY_RATE_LIMIT, ENGAGE_DEADLINE
+    global METRICS_FILE, METRICS_LABELS
+    global _api, _client, _state_store, _price_history, _reply_bucket, _content
+    global _outbox, _circuit_breaker, _outbox_reconciled, _engagement_store, _content_guard
+    
+    prefix = account.get("env_prefix", "")
+    TWITTER_CREDENTIALS = tuple(
+        os.environ.get(prefix + name) for name in (
+            "TWITTER_CONSUMER_KEY", "TWITTER_CONSUMER_SECRET",
+            "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_TOKEN_SECRET"
+        )
+    )
+    _api = _client = None
+    DRY_RUN = account.get("dry_run", DRY_RUN)
+    
+    STATE_DIR = account["state_dir"]
+    os.makedirs(STATE_DIR, exist_ok=True)
+    CONTENT_DIR = account.get("content_dir", CONTENT_DIR)
+    REPLY_RATE_LIMIT = account.get("reply_rate_limit", REPLY_RATE_LIMIT)
+    ENGAGE_DEADLINE = account.get("engage_deadline", ENGAGE_DEADLINE)
+    
+    # Separate metrics per account, so workers don't overwrite each other
+    METRICS_LABELS = {"account": account["name"]}
+    METRICS_FILE = account.get("metrics_file")
+    if METRICS_FILE is None and os.environ.get("METRICS_FILE"):
+        root, ext = os.path.splitext(os.environ["METRICS_FILE"])
+        METRICS_FILE = f"{root}-{account['name']}{ext}"
+    
+    if _state_store is not None:
+        _state_store.close()
+    if _outbox is not None:
+        _outbox.close()
+    if _content_guard is not None:
+        _content_guard.close()
+    _state_store = _price_history = _reply_bucket = _content = None
+    _outbox = _circuit_breaker = _engagement_store = _content_guard = None
+    _outbox_reconciled = False
+
+def _run_account(account, snapshot):
+    """Worker entry point: run the bot once for one account"""
+    configure_account(account)
+    print(f"[{account['name']}] starting run")
+    run_bot(snapshot)
+    if not DRY_RUN:
+        save_price_history()
+        get_outbox().close()
+    get_state_store().close()
+    return account["name"]
+
+def run_accounts(path, workers=None):
+    """Run every configured account once, sharing one market/news snapshot.
+    
+    Market data and news are fetched once in this process; each account
+    then runs in its own worker process (one account per process, so no
+    client or state leaks between them) and only fetches its own mentions.
+    """
+    accounts = load_accounts(path)
+    print(f"Running {len(accounts)} accounts at {datetime.now().isoformat()}")
+    
+    crypto_data, news_items, _ = gather_sources({}, sources=("market", "news"))
+    if not crypto_data:
+        print("Failed to get crypto data, aborting run")
+        return
+    snapshot = (crypto_data, news_items)
+    
+    workers = workers or min(len(accounts), os.cpu_count() or 1)
+    # spawn: forking a process that already has fetch threads running isn't safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             max_tasks_per_child=1) as pool:
+        futures = {
+            pool.submit(_run_account, dict(account, dry_run=DRY_RUN), snapshot): account["name"]
+            for account in accounts
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[{futures[future]}] run failed: {e}")
+    
+    print(f"All accounts completed at {datetime.now().isoformat()}")
+
 if __name__ == "__main__":
-    # For local testing, run once
-    run_bot()
-    
-    # For scheduled running (if running locally or in a container)
-    # schedule.every(3).hours.do(run_bot)
-    # 
-    # while True:
-    #     schedule.run_pending()
-    #     time.sleep(60)
+    parser = argparse.ArgumentParser(description="Crypto Twitter bot")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running with the in-process scheduler instead of a single run")
+    parser.add_argument("--watch", action="store_true",
+                        help="watch prices continuously and post alerts as soon as a coin moves")
+    parser.add_argument("--migrate-state", action="store_true",
+                        help="import agent_memory.json into agent_memory.db and exit")
+    parser.add_argument("--accounts", metavar="PATH",
+                        help="run every account in this JSON config once, sharing market data")
+    parser.add_argument("--workers", type=int, help="worker processes for --accounts")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="profile the run with cProfile and dump the stats to PATH")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="generate content and print it instead of posting; state is not saved")
+    args = parser.parse_args()
+    if args.dry_run and args.daemon:
+        parser.error("--dry-run is for single runs, not --daemon")
+    DRY_RUN = args.dry_run
+    
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    if args.migrate_state:
+        migrate_json_to_sqlite(state_path(MEMORY_FILE), state_path(STATE_DB_FILE))
+    elif args.accounts:
+        run_accounts(args.accounts, args.workers)
+    elif args.daemon:
+        run_daemon()
+    elif args.watch:
+        run_watcher()
+    else:
+        # Single run, e.g. from a cron job or GitHub Actions
+        run_bot()
+    
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"Profile written to {args.profile} (view with: python -m pstats {args.profile})")